@@ -3,24 +3,27 @@ Functions used for determining BECMG groups.
 
 Functions:
     all_wind_changes: Determines if change for multiple wind types.
-    cld_change_row: Determines if significant cloud change.
-    dir_change_row: Determines if significant wind direction change.
     find_becmg: Finds a BECMG group.
     get_becmg_period: Determines BECMG group period.
     get_changes: Determines indices of significant changes.
     get_consistent_index: Checks for consistent change.
     get_first_index: Finds first index of significant change.
     get_new_bases: Determines new base conditions after a BECMG group.
+    get_next_becmgs: Finds options for next BECMG group.
     get_wind_vals: Collects wind data used in base conditions calcs.
-    gust_change_row: Determines if significant wind gust change.
-    mean_change_row: Determines if significant wind mean change.
+    new_option: Creates BECMG option with initial base conditions.
+    option_key: Gets key identifying future of BECMG option.
+    option_to_dict: Converts BECMG option to dictionary.
+    prune_options: Removes dominated BECMG options and limits number.
     vals_dir: Determines if dir change valid for using IMPROVER data.
     vals_mean: Determines if mean change valid for using IMPROVER data.
     vals_gust: Determines if gust change valid for using IMPROVER data.
-    vis_change_row: Determines if significant visibility change.
 """
+from collections import namedtuple
 import copy
+from types import MappingProxyType
 
+import numpy as np
 import pandas as pd
 
 import bases_changes.bases as ba
@@ -28,6 +31,12 @@ import common.calculations as ca
 import common.checks as ch
 import common.configs as co
 
+# Compact BECMG option used during search - a tuple of read-only base
+# conditions records, the index of the start of the remaining IMPROVER
+# data, the BECMG score and whether any more BECMG groups are needed
+BecmgOption = namedtuple('BecmgOption', ['groups', 'start', 'score',
+                                         'finished'])
+
 
 def all_wind_changes(row):
     """
@@ -48,118 +57,76 @@ def all_wind_changes(row):
     return change
 
 
-def cld_change_row(row):
-    """
-    Determines if cloud change significant from base conditions on row
-    of dataframe.
-
-    Args:
-        row (pandas.Series): Row of dataframe
-    Returns:
-        change (str): Indicator for whether change significant
-    """
-    # Check if cloud change significant
-    change = ch.cld_change(row['base_cld_cat'], row['cld_cat'],
-                           row['rules_col'])
-
-    return change
-
-
-def dir_change_row(row):
+def find_becmg(becmg_options, tdf, memo):
     """
-    Determines if wind direction change significant from base conditions
-    on row of dataframe.
-
-    Args:
-        row (pandas.Series): Row of dataframe
-    Returns:
-        change (bool): Indicator for whether change significant
-    """
-    # Check id direction change significant
-    change = ch.dir_change((row['wind_dir'], row['base_wind_dir']),
-                           (row['wind_mean'], row['base_wind_mean']),
-                           row['rules_col'])
-
-    return change
-
-
-def find_becmg(becmg_options):
-    """
-    Finds BECMG group options (if any to find), updating IMPROVER data
-    in each case for next time the function is called. IMPROVER data
-    should only be at the 50th percentiles as BECMG groups are
-    deterministic.
+    Finds BECMG group options (if any to find), moving the start of the
+    remaining IMPROVER data in each case for next time the function is
+    called. IMPROVER data should only be at the 50th percentiles as
+    BECMG groups are deterministic. Options are pruned after each step
+    so that the search is bounded by co.BECMG_BEAM_WIDTH.
 
     Args:
         becmg_options (list): List containing options for BECMG groups
+        tdf (pandas.DataFrame): IMPROVER data shared by all options
+        memo (dict): Next BECMG group options already found, keyed by
+                     remaining IMPROVER data and base conditions
     Returns:
         becmg_options (list): Updated list of BECMG groups
         keep_searching (bool): Indication for whether to keep searching
                                for more BECMG group options
     """
-    # To prevent for loop iterating through any added options, define
-    # the length of becmg options now use to break for loop
-    num_options = len(becmg_options)
+    # Options are immutable so collect updated options in new list,
+    # replacing each option with its first branch and adding any other
+    # branches to the end
+    new_options = list(becmg_options)
 
     # Loop through each of the current BECMG group options, branching
     # out new ones if necessary (default that no new groups to find)
     keep_searching = False
     for ind, option in enumerate(becmg_options):
 
-        # Break for loop if it has moved beyond the original options
-        if ind == num_options:
-            break
-
         # Move to next option if no more BECMG groups to be found
-        if option['finished']:
+        if option.finished:
             continue
 
-        # Get latest bases and tdf from option
-        bases = option['groups'][-1]
-        tdf = option['data']
-
-        # Find valid change indices
-        bdf, valid_indices = get_changes(tdf, bases)
+        # Find options for next BECMG group, reusing those found for any
+        # other option with the same remaining data and base conditions
+        key = option_key(option)
+        if key not in memo:
+            memo[key] = get_next_becmgs(tdf[option.start:], option.groups[-1])
+        next_becmgs = memo[key]
 
-        # If no change indices found, no more BECMG groups are needed
-        if not valid_indices:
-            option['finished'] = True
+        # If no BECMG group options found, no more BECMG groups are needed
+        if not next_becmgs:
+            new_options[ind] = option._replace(finished=True)
             continue
 
         # If this point is reached, new base conditions will be created
         # so there is potential for more BECMG groups
         keep_searching = True
 
-        # For wind changes, collect values to calculate base conditions
-        wind_vals = get_wind_vals(bdf, valid_indices)
-
-        # Determine next BECMG group period and type (if any)
-        period_options, becmg_types = get_becmg_periods(valid_indices, tdf,
-                                                        option)
-
-        # Get new base values following BECMG for each option
-        for ind, p_option in enumerate(period_options):
+        # Branch out option for each BECMG group option (sharing
+        # read-only base conditions between options)
+        for b_ind, becmg in enumerate(next_becmgs):
+            branch = BecmgOption(option.groups + (becmg['bases'],),
+                                 option.start + becmg['offset'],
+                                 option.score + becmg['score'], False)
+            if b_ind == 0:
+                new_options[ind] = branch
+            else:
+                new_options.append(branch)
 
-            # Determine new base condions following BECMG
-            new_bases = get_new_bases(p_option['tdf'], p_option['period'],
-                                      becmg_types, bases, wind_vals)
+    # Remove dominated options and limit number of options kept
+    becmg_options = prune_options(new_options)
 
-            # Add to current option or create new one if necessary
-            if ind == 0:
-                option['groups'].append(new_bases)
-                option['data'] = p_option['tdf']
-                option['score'] += p_option['score']
-            else:
-                new_option = p_option['option']
-                new_option['groups'].append(new_bases)
-                new_option['data'] = p_option['tdf']
-                new_option['score'] += p_option['score']
-                becmg_options.append(new_option)
+    # Only keep searching if any options left to search
+    keep_searching = keep_searching and not all(option.finished
+                                                for option in becmg_options)
 
     return becmg_options, keep_searching
 
 
-def get_becmg_periods(change_inds, tdf, option):
+def get_becmg_periods(change_inds, tdf):
     """
     Calculates an appropriate BECMG period, with length between accepted
     values of 2 to 4 hours.
@@ -168,9 +135,9 @@ def get_becmg_periods(change_inds, tdf, option):
         change_inds (dict): Indices of BECMG changes by weather type
         tdf (pandas.DataFrame): IMPROVER and airport data
     Return:
-        becmg_period (tuple): BECMG group period
+        period_options (list): BECMG group periods, updated IMPROVER
+                               data, its index in tdf and scores
         becmg_types (list): Weather types to include in BECMG group
-        new_tdf (pandas.DataFrame): Updated IMPROVER data
     """
     # Get first index
     first_wx = min(change_inds, key=change_inds.get)
@@ -221,9 +188,6 @@ def get_becmg_periods(change_inds, tdf, option):
         # Define period from chosen indices
         becmg_period = (tdf['time'].iloc[first], tdf['time'].iloc[second])
 
-        # Create copy of options to be updated later
-        new_option = copy.deepcopy(option)
-
         # Score the option based on whether the cange indices sit in the
         # middle of the BECMG group (preferable) or at the edge - lower
         # score is better (avoid dividing by zero by adding 1 to pads)
@@ -234,7 +198,7 @@ def get_becmg_periods(change_inds, tdf, option):
 
         # Add options to dictionary
         period_options.append({'period': becmg_period, 'tdf': new_tdf,
-                               'option': new_option, 'score': score})
+                               'offset': second, 'score': score})
 
     return period_options, becmg_types
 
@@ -269,11 +233,22 @@ def get_changes(tdf, bases):
     bdf.reset_index(drop=True, inplace=True)
 
     # Find significant changes from base conditions
-    change_funcs = {'wind_dir': dir_change_row, 'wind_mean': mean_change_row,
-                    'wind_gust': gust_change_row, 'vis': vis_change_row,
-                    'cld': cld_change_row}
-    for wx, change_func in change_funcs.items():
-        bdf[f'{wx}_changes'] = bdf.apply(change_func, axis=1)
+    rules = bdf['rules_col'].to_numpy()
+    bdf['wind_dir_changes'] = ch.dir_change_col(
+        (bdf['wind_dir'].to_numpy(), bases['wind_dir']),
+        (bdf['wind_mean'].to_numpy(), bases['wind_mean']), rules
+    )
+    bdf['wind_mean_changes'] = ch.mean_change_col(
+        bases['wind_mean'], bdf['wind_mean'].to_numpy(), rules
+    )
+    bdf['wind_gust_changes'] = ch.gust_change_col(
+        bases['wind_gust'], bdf['wind_gust'].to_numpy(), bases['wind_mean'],
+        bdf['wind_mean'].to_numpy(), becmg=True
+    )
+    bdf['vis_changes'] = ch.vis_change_col(bases['vis_cat'],
+                                           bdf['vis_cat'].to_numpy())
+    bdf['cld_changes'] = ch.cld_change_col(bases['cld_cat'],
+                                           bdf['cld_cat'].to_numpy(), rules)
 
     # For direction and mean, all changes covered in BECMG groups, so
     # use index of first change from base conditions
@@ -316,20 +291,26 @@ def get_consistent_index(bdf, wx, hrs_remaining):
     Return:
         change_index (int): Index of first consistent change
     """
-    # Start with default of no consistent change by assigning high index
-    change_index = hrs_remaining + 1
-
-    # Loop through bools indicating significant changes and break for
-    # if consistent change found
-    for ind, change in enumerate(bdf[f'{wx}_changes']):
-
-        # Check if next 4 values are of the same sign, indicating a
-        # consistent change of the same type (increase or decrease)
-        next_4_vals = bdf[f'{wx}_changes'][ind: ind + 4]
-        if change and any([all(val > 0 for val in next_4_vals),
-                           all(val < 0 for val in next_4_vals)]):
-            change_index = ind
-            break
+    # Count increases and decreases in each window of (up to) the next 4
+    # values using cumulative sums
+    changes = bdf[f'{wx}_changes'].to_numpy()
+    starts = np.arange(len(changes))
+    ends = np.minimum(starts + 4, len(changes))
+    incs = np.concatenate([[0], np.cumsum(changes > 0)])
+    decs = np.concatenate([[0], np.cumsum(changes < 0)])
+
+    # Consistent change if all values in window are of the same sign,
+    # indicating a consistent change of the same type (increase or
+    # decrease)
+    consistent = ((incs[ends] - incs[starts] == ends - starts)
+                  | (decs[ends] - decs[starts] == ends - starts))
+    consistent_inds = np.flatnonzero(consistent)
+
+    # Default of no consistent change is a high index
+    if consistent_inds.size:
+        change_index = int(consistent_inds[0])
+    else:
+        change_index = hrs_remaining + 1
 
     return change_index
 
@@ -346,10 +327,13 @@ def get_first_index(bdf, wx, hrs_remaining):
         change_index (int): Index of first change
     """
     # Find index first non-False value in changes column (if any)
-    change_index = bdf.where(bdf[f'{wx}_changes']).first_valid_index()
+    change_inds = np.flatnonzero(bdf[f'{wx}_changes'].to_numpy())
 
-    # Give high index if no changes (to avoid confusing None with 0)
-    if not change_index:
+    # Give high index if no changes (a change at index 0 is also treated
+    # as no change)
+    if change_inds.size and change_inds[0]:
+        change_index = int(change_inds[0])
+    else:
         change_index = hrs_remaining + 1
 
     return change_index
@@ -418,6 +402,44 @@ def get_new_bases(site_data, period, wx_types, old_bases, wind_vals):
     return bases
 
 
+def get_next_becmgs(tdf, bases):
+    """
+    Finds options for the next BECMG group, each with read-only new
+    base conditions, the index in tdf of the remaining IMPROVER data and
+    score.
+
+    Args:
+        tdf (pandas.DataFrame): IMPROVER data
+        bases (dict): Current base conditions
+    Returns:
+        next_becmgs (list): Next BECMG group options (empty if no more
+                            BECMG groups needed)
+    """
+    # Find valid change indices
+    bdf, valid_indices = get_changes(tdf, bases)
+
+    # If no change indices found, no more BECMG groups are needed
+    if not valid_indices:
+        return []
+
+    # For wind changes, collect values to calculate base conditions
+    wind_vals = get_wind_vals(bdf, valid_indices)
+
+    # Determine next BECMG group period and type (if any)
+    period_options, becmg_types = get_becmg_periods(valid_indices, tdf)
+
+    # Determine new base condions following BECMG for each option
+    next_becmgs = []
+    for p_option in period_options:
+        new_bases = get_new_bases(p_option['tdf'], p_option['period'],
+                                  becmg_types, bases, wind_vals)
+        next_becmgs.append({'bases': MappingProxyType(new_bases),
+                            'offset': p_option['offset'],
+                            'score': p_option['score']})
+
+    return next_becmgs
+
+
 def get_wind_vals(bdf, valid_indices):
     """
     Whenever new base conditions are calculated for any wind type
@@ -487,39 +509,109 @@ def get_wind_vals(bdf, valid_indices):
     return change_vals
 
 
-def gust_change_row(row):
+def new_option(bases):
     """
-    Determines if gust change significant from base conditions on row
-    of dataframe.
+    Creates BECMG option containing initial base conditions, starting at
+    the beginning of the IMPROVER data.
 
     Args:
-        row (pandas.Series): Row of dataframe
+        bases (dict): Initial base conditions
     Returns:
-        change (str or bool): Indicator for whether change significant
+        option (BecmgOption): BECMG group option
     """
-    # Check if change significant
-    change = ch.gust_change(row['base_wind_gust'], row['wind_gust'],
-                            row['base_wind_mean'], row['wind_mean'],
-                            becmg=True)
+    option = BecmgOption((MappingProxyType(copy.deepcopy(bases)),), 0, 0,
+                         False)
 
-    return change
+    return option
 
 
-def mean_change_row(row):
+def option_key(option):
     """
-    Determines if wind mean change significant from base conditions on
-    row of dataframe.
+    Gets key identifying everything that later BECMG groups of an option
+    depend on - the start of the remaining IMPROVER data and the latest
+    base conditions.
 
     Args:
-        row (pandas.Series): Row of dataframe
+        option (BecmgOption): BECMG group option
     Returns:
-        change (str or bool): Indicator for whether change significant
+        key (tuple): Key identifying future of BECMG option
     """
-    # Check if change significant
-    change = ch.mean_change(row['base_wind_mean'], row['wind_mean'],
-                            row['rules_col'])
+    # Latest base conditions, ignoring BECMG group info
+    bases = option.groups[-1]
+    bases_key = repr(sorted((wx, val) for wx, val in bases.items()
+                            if wx not in co.BECMG_INFO_KEYS))
 
-    return change
+    # Start of remaining IMPROVER data
+    key = (option.start, bases_key)
+
+    return key
+
+
+def option_to_dict(option):
+    """
+    Converts BECMG option to dictionary with modifiable copies of base
+    conditions, as used when adding TEMPO/PROB groups.
+
+    Args:
+        option (BecmgOption): BECMG group option
+    Returns:
+        option_dict (dict): BECMG groups and score
+    """
+    option_dict = {'groups': [copy.deepcopy(dict(group))
+                              for group in option.groups],
+                   'score': option.score}
+
+    return option_dict
+
+
+def prune_options(becmg_options):
+    """
+    Removes BECMG options that cannot lead to the best TAF and limits
+    the number of options kept to co.BECMG_BEAM_WIDTH. Options with more
+    groups than the shortest finished option are removed, as are
+    unfinished options whose remaining search is the same as that of an
+    option with a better score. Remaining options are ordered by number
+    of groups, then score, then original order so that results are
+    reproducible.
+
+    Args:
+        becmg_options (list): List containing options for BECMG groups
+    Returns:
+        kept_options (list): Pruned list of BECMG group options
+    """
+    # Order options by number of groups, then score (sort is stable so
+    # ties are kept in original order)
+    becmg_options = sorted(becmg_options, key=lambda x: (len(x.groups),
+                                                        x.score))
+
+    # Get smallest number of groups of finished options (if any)
+    finished_groups = [len(option.groups) for option in becmg_options
+                       if option.finished]
+    max_groups = min(finished_groups) if finished_groups else None
+
+    # Keep best options, up to beam width
+    kept_options, keys = [], set()
+    for option in becmg_options:
+
+        # Stop if beam width reached
+        if len(kept_options) == co.BECMG_BEAM_WIDTH:
+            break
+
+        # Ignore options with too many groups
+        if max_groups is not None and len(option.groups) > max_groups:
+            continue
+
+        # Ignore unfinished options if better option with the same
+        # remaining search already kept
+        if not option.finished:
+            key = option_key(option)
+            if key in keys:
+                continue
+            keys.add(key)
+
+        kept_options.append(option)
+
+    return kept_options
 
 
 def vals_dir(row):
@@ -604,19 +696,3 @@ def vals_gust(row):
     change = all([base_change, not first_change, after_first])
 
     return change
-
-
-def vis_change_row(row):
-    """
-    Determines if visibility change significant from base conditions on
-    row of dataframe.
-
-    Args:
-        row (pandas.Series): Row of dataframe
-    Returns:
-        change (bool): Indicator for whether change significant
-    """
-    # Check if change significant
-    change = ch.vis_change(row['base_vis_cat'], row['vis_cat'])
-
-    return change
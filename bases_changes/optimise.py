@@ -8,9 +8,12 @@ Functions:
     cld_merge: Checks if cloud values groups allow merging.
     combine_consecutives:Combines consecutive change groups if possible.
     combine_overlaps: Combines overlapping change groups.
+    compatible: Checks if pair of change groups could be merged.
     consecutive: Checks if change periods in groups are consecutive.
     get_base_value_cats: Gets TAF categories in change groups and bases.
     get_change_type: Gets suitable change type from combo of groups.
+    get_cliques: Gets combinations of mutually compatible groups.
+    get_runs: Gets combinations of groups with back-to-back periods.
     get_unq_wxs: Gets unique weather changes from change groups.
     optimise_groups: Combines change groups where possible.
     same_prob: Determines if change types represent same probability.
@@ -266,15 +269,20 @@ def combine_consecutives(groups, rules):
         # Get groups with same wx changes
         wx_groups = [grp for grp in probs_tempos if grp['wx_changes'] == wxs]
 
-        # Start by attempting to combine all groups, then incrementally
-        # reduce number of groups to combine
+        # Get all runs of groups with back-to-back change periods,
+        # indexed by number of groups in run
+        runs = get_runs(wx_groups)
+
+        # Start by attempting to combine as many groups as possible,
+        # then incrementally reduce number of groups to combine
         ignore_groups = []
-        count = len(wx_groups)
-        while count > 0 and wx_groups:
+        count = len(runs)
+        while count > 0:
 
-            # All possible combinations of change groups (number of
-            # groups in each combination dictated by count)
-            combinations = itertools.combinations(wx_groups, count)
+            # Possible combinations of change groups (number of groups
+            # in each combination dictated by count)
+            combinations = [tuple(wx_groups[ind] for ind in run)
+                            for run in runs[count - 1]]
 
             # Loop through all combos and attempt to merge into 1 group
             for comb in combinations:
@@ -335,15 +343,20 @@ def combine_overlaps(groups):
     merged_groups = [group for group in groups
                      if group['change_type'] in ['base', 'BECMG']]
 
-    # Start by attempting to combine all groups, then incrementally
-    # reduce number of groups to combine
+    # Get all combinations of mutually compatible groups, indexed by
+    # number of groups in combination
+    cliques = get_cliques(probs_tempos)
+
+    # Start by attempting to combine as many groups as possible, then
+    # incrementally reduce number of groups to combine
     ignore_groups = []
-    count = len(probs_tempos)
-    while count > 0 and probs_tempos:
+    count = len(cliques)
+    while count > 0:
 
-        # All possible combinations of change groups (number of groups
-        # in each combination dictated by count)
-        combinations = itertools.combinations(probs_tempos, count)
+        # Possible combinations of change groups (number of groups in
+        # each combination dictated by count)
+        combinations = [tuple(probs_tempos[ind] for ind in clique)
+                        for clique in cliques[count - 1]]
 
         # Order combinations in terms of change types - consider
         # combinations with similar probs first
@@ -413,6 +426,32 @@ def combine_overlaps(groups):
     return merged_groups
 
 
+def compatible(grp_1, grp_2):
+    """
+    Checks if a pair of change groups could be merged as part of a
+    larger combination of groups. Any combination containing a pair that
+    is not compatible can not be merged.
+
+    Args:
+        grp_1 (dict): First change group
+        grp_2 (dict): Second change group
+    Returns:
+        compat (bool): Indicator for whether groups are compatible
+    """
+    # Not compatible if same weather in both groups
+    wxs = list(itertools.chain(grp_1['wx_changes'], grp_2['wx_changes']))
+    if len(wxs) != len(set(wxs)):
+        return False
+
+    # Not compatible if groups have different fixed probs (change
+    # periods are left to check_periods for each combination, as a pair
+    # can fail where a larger combination containing it passes, because
+    # groups in the combination change which other groups are pulled in)
+    compat = get_change_type((grp_1, grp_2))[0] is not None
+
+    return compat
+
+
 def consecutive(comb):
     """
     Checks if change periods in combination of groups are consecutive,
@@ -520,6 +559,79 @@ def get_change_type(comb):
     return change_type, fix_prob
 
 
+def get_cliques(probs_tempos):
+    """
+    Gets all combinations of PROB/TEMPO groups in which every pair of
+    groups is compatible, using bitsets of compatible groups to avoid
+    considering every possible combination.
+
+    Args:
+        probs_tempos (list): PROB/TEMPO groups
+    Returns:
+        cliques (list): Combinations of group indices, nested by number
+                        of groups in combination
+    """
+    # Bitset of compatible groups for each group
+    masks = [0] * len(probs_tempos)
+    for ind_1, ind_2 in itertools.combinations(range(len(probs_tempos)), 2):
+        if compatible(probs_tempos[ind_1], probs_tempos[ind_2]):
+            masks[ind_1] |= 1 << ind_2
+            masks[ind_2] |= 1 << ind_1
+
+    # Start with single groups, each with bitset of groups that could
+    # be added to them
+    level = [((ind,), mask) for ind, mask in enumerate(masks)]
+
+    # Extend combinations one group at a time, only adding later groups
+    # compatible with all groups already in combination (this keeps
+    # the same order as itertools.combinations)
+    cliques = []
+    while level:
+        cliques.append([clique for clique, _ in level])
+        next_level = []
+        for clique, cands in level:
+            for ind in range(clique[-1] + 1, len(probs_tempos)):
+                if cands >> ind & 1:
+                    next_level.append((clique + (ind,), cands & masks[ind]))
+        level = next_level
+
+    return cliques
+
+
+def get_runs(wx_groups):
+    """
+    Gets all combinations of change groups that could form a single
+    consecutive period, found by following chains of groups where each
+    group starts when the previous one ends.
+
+    Args:
+        wx_groups (list): Change groups with the same weather changes
+    Returns:
+        runs (list): Combinations of group indices, ordered as in
+                     itertools.combinations and nested by number of
+                     groups in combination
+    """
+    # Groups starting at the end of each group
+    next_inds = [[ind_2 for ind_2, grp_2 in enumerate(wx_groups)
+                  if ind_2 != ind_1
+                  and grp_2['change_period'][0] == grp_1['change_period'][1]]
+                 for ind_1, grp_1 in enumerate(wx_groups)]
+
+    # Start with single groups, then extend chains one group at a time
+    chains = [[ind] for ind in range(len(wx_groups))]
+    runs = []
+    while chains:
+
+        # Order group indices in each chain as in itertools.combinations
+        runs.append(sorted({tuple(sorted(chain)) for chain in chains}))
+
+        # Add all groups starting at end of last group in each chain
+        chains = [chain + [ind] for chain in chains
+                  for ind in next_inds[chain[-1]] if ind not in chain]
+
+    return runs
+
+
 def get_unq_wxs(probs_tempos):
     """
     Gets unique weather changes from change groups.
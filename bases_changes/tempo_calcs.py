@@ -3,6 +3,10 @@ Functions used in TEMPO and PROB group calculations.
 
 Functions:
     adjust_wind: Checks wind values and adjusts if necessary.
+    batch_calc_close_score: Calculates closeness scores of options.
+    batch_calc_safe_score: Calculates TAF safety scores of options.
+    batch_changes_tests: Determines whether change group options viable.
+    batch_get_score: Calculates performance scores of options.
     calc_close_score: Calculates closeness score.
     calc_safe_score: Calculates TAF safety score.
     calc_simple_score: Calculates TAF simplicity score.
@@ -12,7 +16,7 @@ Functions:
     get_changes: Gets DataFrame just with significant change indicators.
     get_clds: Determines suitable cloud values for TEMPO/PROB group.
     get_fix_prob: Determines when probs in a group should be fixed.
-    get_groups: Gets change groups from dataframe.
+    get_groups: Gets change groups from array of changes.
     get_other_bases: Finds extra base conditions.
     get_score: Calculates performance score for change group option.
     get_vis_wx: Gets suitable vis/sig wx values for TEMPO/PROB group.
@@ -86,119 +90,204 @@ def adjust_wind(vals, bases, cat):
     return vals
 
 
-def calc_close_score(changes, option, cat_weights):
+def batch_calc_close_score(changes, options, cat_weights):
     """
-    For each category predicted by the model, calculates a score that
-    represents how close the option is in terms of the percentile chosen
-    and in terms of forecast time. Scores for each category are weighted
-    by their prominence in full model forecast. Maximum (best) score is
-    1, minimum (worst) score is 0.
+    Calculates closeness scores (see calc_close_score) for a stack of
+    change group options at once.
 
     Args:
-        changes (pandas.DataFrame): All non-duplicated changes
-        option: (pandas.DataFrame): Option for change groups
+        changes (numpy.ndarray): All non-duplicated changes
+        options (numpy.ndarray): Options for change groups, stacked
+                                 along first axis
         cat_weights (dict): Category changes and their weights
     Returns:
-        score (float): Score
+        scores (numpy.ndarray): Scores
     """
-    # Start with default score of zero and update with score for each
+    # Percentile of each change column
+    col_percs = np.array([int(col[:2]) for col in co.CHANGE_COLS])
+
+    # Start with default scores of zero and update with score for each
     # category
-    score = 0
+    scores = np.zeros(len(options))
 
-    # Find score for each category
+    # Find scores for each category
     for cat in cat_weights:
 
-        # If option does not contain category, score is zero so move on
-        # to next iteration without adding to overall score.
-        if cat not in option.values:
-            continue
-
         # Find fraction of forecast times in which category predicted in
         # option is the same as that in changes
-        c_inds = [ind for ind in changes.index
-                  if cat in changes.iloc[ind].values]
-        o_inds = [ind for ind in option.index
-                  if cat in option.iloc[ind].values]
-
-        matched_inds = [ind for ind in c_inds if ind in o_inds]
-        cat_score = len(matched_inds) / len(c_inds)
+        c_cats, o_cats = changes == cat, options == cat
+        c_rows = c_cats.any(axis=1)
+        matched_rows = c_rows & o_cats.any(axis=2)
+        num_matched = matched_rows.sum(axis=1)
+        cat_scores = num_matched / c_rows.sum()
 
         # If category predicted at the same time, penalise if
-        # percentiles different
-        prob_diffs = []
-        for ind in matched_inds:
-            c_perc = changes.iloc[ind][changes.iloc[ind] == cat].index
-            o_perc = option.iloc[ind][option.iloc[ind] == cat].index
-
-            # Should only be one percentile predicting category so check
-            assert (len(c_perc) == 1
-                    and len(o_perc) == 1), 'Multiple percentiles'
-
-            # Maximum probability difference is 20 (e.g. 70th vs 50th
-            # percentiles). Increased and decreased changes are treated
-            # separately so lower and higher percentiles (e.g. 30th vs
-            # 70th) will not be compared
-            prob_diff = abs(int(c_perc[0][:2]) - int(o_perc[0][:2]))
-            prob_diffs.append(prob_diff)
+        # percentiles different - should only be one percentile
+        # predicting category so check
+        assert ((c_cats.sum(axis=1) == 1) | ~matched_rows).all() and (
+            (o_cats.sum(axis=2) == 1) | ~matched_rows
+        ).all(), 'Multiple percentiles'
+
+        # Maximum probability difference is 20 (e.g. 70th vs 50th
+        # percentiles). Increased and decreased changes are treated
+        # separately so lower and higher percentiles (e.g. 30th vs
+        # 70th) will not be compared
+        prob_diffs = np.abs(col_percs[c_cats.argmax(axis=1)]
+                            - col_percs[o_cats.argmax(axis=2)])
 
         # Get the mean probability difference and apply penalty to score
         # by dividing by 100 - this means that the maximum penalty is
         # multiplying the score by 0.8
-        if not prob_diffs:
-            mean_prob_diff = 0
-        else:
-            mean_prob_diff = np.mean(prob_diffs)
-        cat_score *= (1 - mean_prob_diff / 100)
+        mean_prob_diffs = np.divide(
+            np.where(matched_rows, prob_diffs, 0).sum(axis=1), num_matched,
+            out=np.zeros(len(options)), where=num_matched > 0
+        )
+        cat_scores *= (1 - mean_prob_diffs / 100)
 
-        # Weight score by category prominence and add to overall score -
-        # this ensures that the eventual score will be between 0 and 1
-        weighted_cat_score = cat_score * cat_weights[cat]
-        score += weighted_cat_score
+        # Weight score by category prominence and add to overall score
+        # if option contains category - this ensures that the eventual
+        # score will be between 0 and 1
+        weighted_cat_scores = cat_scores * cat_weights[cat]
+        scores += np.where(o_cats.any(axis=(1, 2)), weighted_cat_scores, 0)
 
-    return score
+    return scores
 
 
-def calc_safe_score(changes, option):
+def batch_calc_safe_score(changes, options):
     """
-    This score provides a measure for how safe the eventual TAF will be
-    in terms of its likelihood of going bust. It is framed in terms of
-    categories covered. If all categories forecast in the model are
-    covered by the option, a score of 1 will be given. If no categories
-    are covered a score of 0 will be given.
+    Calculates safety scores (see calc_safe_score) for a stack of change
+    group options at once.
 
     Args:
-        changes (pandas.DataFrame): All non-duplicated changes
-        option: (pandas.DataFrame): Option for change groups
+        changes (numpy.ndarray): All non-duplicated changes
+        options (numpy.ndarray): Options for change groups, stacked
+                                 along first axis
     Returns:
-        score (float): Score
+        scores (numpy.ndarray): Scores
     """
-    # Drop time columns
-    no_time_option = option.drop(['time'], axis=1)
-    no_time_changes = changes.drop(['time'], axis=1)
-
     # Find rows with a decrease and rows with an increase
-    rows_w_dec = no_time_changes.min(axis=1)<0
-    rows_w_inc = no_time_changes.max(axis=1)>0
+    rows_w_dec = changes.min(axis=1) < 0
+    rows_w_inc = changes.max(axis=1) > 0
 
-    # Create dfs of bools indicating if decrease/increase covered.
-    dec_covered = (no_time_option[rows_w_dec].min(axis=1)
-                   <= no_time_changes[rows_w_dec].min(axis=1))
-    inc_covered = (no_time_option[rows_w_inc].max(axis=1)
-                   >= no_time_changes[rows_w_inc].max(axis=1))
-    cats_covered = pd.concat([inc_covered, dec_covered])
+    # Create arrays of bools indicating if decrease/increase covered
+    dec_covered = (options[:, rows_w_dec].min(axis=2)
+                   <= changes[rows_w_dec].min(axis=1))
+    inc_covered = (options[:, rows_w_inc].max(axis=2)
+                   >= changes[rows_w_inc].max(axis=1))
 
     # Take mean of rows with categories covered (if any)
-    if cats_covered.empty:
-        score = 0
+    num_rows = rows_w_dec.sum() + rows_w_inc.sum()
+    if not num_rows:
+        scores = np.zeros(len(options))
     else:
-        score = cats_covered.mean()
+        scores = (inc_covered.sum(axis=1) + dec_covered.sum(axis=1)) / num_rows
 
     # Cap score at ~0.5 for options in which not all categories covered
     # - this rewards options in which all categories are covered
-    if score < 1:
-        score *= 0.5
+    scores = np.where(scores < 1, scores * 0.5, scores)
 
-    return score
+    return scores
+
+
+def batch_changes_tests(options):
+    """
+    Performs the tests in changes_tests on a stack of change group
+    options at once.
+
+    Args:
+        options (numpy.ndarray): Options for change groups, stacked
+                                 along first axis
+    Returns:
+        passed (numpy.ndarray): Indicators for whether tests passed
+    """
+    # Count overlapping groups at each time
+    options = options.astype(np.int16)
+    non_zeros = options != 0
+    overlaps = non_zeros.sum(axis=2)
+
+    # Can have 2 overlapping groups under certain conditions - can't
+    # have increasing and decreasing conditions forecast at the same
+    # time, can't forecast the same category and one group must be a
+    # TEMPO and one a PROB (i.e. change in 50th percentile)
+    mixed = (options > 0).any(axis=2) & (options < 0).any(axis=2)
+    fill_max, fill_min = np.iinfo(np.int16).max, np.iinfo(np.int16).min
+    same_cat = (np.where(non_zeros, options, fill_max).min(axis=2)
+                == np.where(non_zeros, options, fill_min).max(axis=2))
+    no_tempo = ~((options[..., co.CHANGE_COLS.index('50d')] == 0)
+                 ^ (options[..., co.CHANGE_COLS.index('50i')] == 0))
+    bad_overlaps = (overlaps == 2) & (mixed | same_cat | no_tempo)
+
+    # Tests passed if any changes, no more than 2 overlapping prob
+    # groups and no bad overlaps
+    passed = (non_zeros.any(axis=(1, 2)) & ~(overlaps > 2).any(axis=1)
+              & ~bad_overlaps.any(axis=1))
+
+    return passed
+
+
+def batch_get_score(changes, options, cat_weights, groups_list):
+    """
+    Calculates combined performance scores (see get_score) for a stack
+    of change group options at once.
+
+    Args:
+        changes (numpy.ndarray): All non-duplicated changes
+        options (numpy.ndarray): Options for change groups, stacked
+                                 along first axis
+        cat_weights (dict): Category changes and their weights
+        groups_list (list): TEMPO/PROB groups based on each option
+    Returns:
+        total_scores (numpy.ndarray): Combined performance scores
+    """
+    # Calculate closeness scores
+    closeness = batch_calc_close_score(changes, options, cat_weights)
+
+    # Calculate safety scores
+    safety = batch_calc_safe_score(changes, options)
+
+    # Calculate simplicity scores
+    simplicity = np.array([calc_simple_score(groups)
+                           for groups in groups_list])
+
+    # Combine all scores to get overall scores
+    total_scores = closeness * safety * simplicity
+
+    return total_scores
+
+
+def calc_close_score(changes, option, cat_weights):
+    """
+    For each category predicted by the model, calculates a score that
+    represents how close the option is in terms of the percentile chosen
+    and in terms of forecast time. Scores for each category are weighted
+    by their prominence in full model forecast. Maximum (best) score is
+    1, minimum (worst) score is 0.
+
+    Args:
+        changes (numpy.ndarray): All non-duplicated changes
+        option: (numpy.ndarray): Option for change groups
+        cat_weights (dict): Category changes and their weights
+    Returns:
+        score (float): Score
+    """
+    return batch_calc_close_score(changes, option[np.newaxis], cat_weights)[0]
+
+
+def calc_safe_score(changes, option):
+    """
+    This score provides a measure for how safe the eventual TAF will be
+    in terms of its likelihood of going bust. It is framed in terms of
+    categories covered. If all categories forecast in the model are
+    covered by the option, a score of 1 will be given. If no categories
+    are covered a score of 0 will be given.
+
+    Args:
+        changes (numpy.ndarray): All non-duplicated changes
+        option: (numpy.ndarray): Option for change groups
+    Returns:
+        score (float): Score
+    """
+    return batch_calc_safe_score(changes, option[np.newaxis])[0]
 
 
 def calc_simple_score(groups):
@@ -234,54 +323,17 @@ def calc_simple_score(groups):
 
 def changes_tests(option):
     """
-    Performs a series of tests to determine whether the the dataframe of
+    Performs a series of tests to determine whether the the array of
     changes would lead to a legal TAF that would also pass best practice
     guidelines (e.g. no simultaneous forecasts of increasing and
     decreasing conditions).
 
     Args:
-        option (pandas.DataFrame): Option for change groups
+        option (numpy.ndarray): Option for change groups
     Returns:
         (Test result) (bool): Indicator for whether tests passed
     """
-    # Take copy of dataframe and drop time column
-    just_percs = option.drop(['time'], axis=1)
-
-    # No point keeping if all zeros
-    if just_percs.astype(bool).sum().sum() == 0:
-        return False
-
-    # Loop though rows (forecast times) of dataframe
-    for _, row in just_percs.iterrows():
-
-        # Number of overlapping groups at this time
-        overlaps = len(row[row != 0])
-
-        # Can't have more than 2 overlapping prob groups
-        if overlaps > 2:
-            return False
-
-        # Can have 2 overlapping groups under certain conditions
-        if overlaps == 2:
-
-            # Can't have increasing and decreasing conditions forecast
-            # at the same time
-            if not row[row > 0].empty and not row[row < 0].empty:
-                return False
-
-            # The two overlapping groups can't be forecasting the same
-            # category
-            if len(row[row != 0].unique()) == 1:
-                return False
-
-            # Otherwise, only case when overlapping groups is when one
-            # is a TEMPO and one is a PROB - i.e. if no changes in the
-            # 50th percentile, do not allow overlap
-            if not (row['50d'] == 0) ^ (row['50i'] == 0):
-                return False
-
-    # If False not returned, all tests have passed, so return True
-    return True
+    return bool(batch_changes_tests(option[np.newaxis])[0])
 
 
 def choose_wx(all_wxs, wxs, cat, base_wx=None):
@@ -366,33 +418,33 @@ def get_changes(stdf):
     Returns:
         changes (pandas.DataFrame): Small dataframe containing changes
     """
-    # Collect changes into smaller dataframe with percentiles as columns
-    # and row for each time
-    changes_percs = stdf[['time', 'percentile', 'change']]
-    for ind, gb_obj in enumerate(changes_percs.groupby(by='percentile')):
-        perc_df = gb_obj[1]
-        perc_df.rename({'change': int(gb_obj[0])}, axis=1, inplace=True)
-        perc_df.drop(['percentile'], axis=1, inplace=True)
-        perc_df.reset_index(drop=True, inplace=True)
-        if ind == 0:
-            changes = perc_df
-        else:
-            changes = changes.merge(perc_df)
+    # Pivot changes into array with row for each time and column for
+    # each percentile (in ascending order)
+    times, time_inds = np.unique(stdf['time'].to_numpy(), return_inverse=True)
+    percs, perc_inds = np.unique(stdf['percentile'].to_numpy(),
+                                 return_inverse=True)
+    matrix = np.zeros((len(times), len(percs)), dtype=int)
+    matrix[time_inds, perc_inds] = stdf['change'].to_numpy()
+
+    # Only keep times with changes at all percentiles
+    filled = np.zeros(matrix.shape, dtype=bool)
+    filled[time_inds, perc_inds] = True
+    times, matrix = times[filled.all(axis=1)], matrix[filled.all(axis=1)]
 
     # For purposes of finding change groups, convert percentiles to
     # strings and split 50th percentile into decreasing (d) and
     # increasing (i) changes
-    changes.columns = changes.columns.astype(str)
-
-    changes['50d'] = changes.apply(lambda x: x['50'] if x['50'] < 0 else 0,
-                                   axis=1)
-    changes['50i'] = changes.apply(lambda x: x['50'] if x['50'] > 0 else 0,
-                                   axis=1)
-    changes.drop(['50'], axis=1, inplace=True)
+    perc_cols = {str(int(perc)): matrix[:, ind]
+                 for ind, perc in enumerate(percs)}
+    perc_cols['50d'] = np.minimum(perc_cols['50'], 0)
+    perc_cols['50i'] = np.maximum(perc_cols.pop('50'), 0)
 
     # Remove duplicate changes (e.g. if 30th and 40th percentiles both
     # predict category 1, just keep 40th change)
-    unq_changes = changes.apply(remove_duplicates, axis=1)
+    unq_cols = remove_duplicates(perc_cols)
+    unq_changes = pd.DataFrame({'time': pd.to_datetime(times),
+                                **{col: unq_cols[col]
+                                   for col in co.CHANGE_COLS}})
 
     return unq_changes
 
@@ -468,36 +520,33 @@ def get_fix_prob(group, groups):
     return False
 
 
-def get_groups(cdf):
+def get_groups(option, times):
     """
-    Gets change groups from a dataframe of changes. The dataframe must
-    have passed the tests in the taf_rules_check() function for this
-    function to work.
+    Gets change groups from an array of changes. The array must have
+    passed the tests in the changes_tests() function for this function
+    to work.
 
     Args:
-        cdf (pandas.DataFrame): Dataframe of significant changes
+        option (numpy.ndarray): Array of significant changes
+        times (list): Time of each row of array
     Returns:
         groups (dict): Change groups
     """
-    # Find all change groups represented in chg_groups dataframe
+    # Find all change groups represented in changes array
     # Dictionary for counting change groups needed - need to keep track
     # of categories forecast and number of zeros to determine when a new
     # change group will be added at each hour in the period
-    cats = {perc: 0 for perc in cdf.columns}
-    zeros = {perc: 0 for perc in cdf.columns}
-    perc_groups = {perc: 0 for perc in cdf.columns}
-    end_times = {perc: None for perc in cdf.columns}
+    cats = {perc: 0 for perc in co.CHANGE_COLS}
+    zeros = {perc: 0 for perc in co.CHANGE_COLS}
+    perc_groups = {perc: 0 for perc in co.CHANGE_COLS}
+    end_times = {perc: None for perc in co.CHANGE_COLS}
     groups = {}
 
     # Loop through each hour and add to dictionary
-    for _, row in cdf.iterrows():
-
-        # Drop time but keep for later
-        time = row['time']
-        row.drop(['time'], inplace=True)
+    for time, row in zip(times, option.tolist()):
 
         # Loop through all percentiles with non-zero entries
-        for perc, cat in row.items():
+        for perc, cat in zip(co.CHANGE_COLS, row):
 
             # Add to zeros if no category forecast
             if cat == 0:
@@ -536,7 +585,7 @@ def get_groups(cdf):
                 zeros[perc] = 0
 
             # End other percentile groups if necessary
-            for o_perc in cdf.columns:
+            for o_perc in co.CHANGE_COLS:
 
                 # Ignore if same percentile or if other percentile is 0
                 if any([o_perc == perc, cats[o_perc] == 0]):
@@ -583,7 +632,7 @@ def get_other_bases(group, o_group):
 
     # Need to check values if any change times overlap and if
     # group cat is more extreme forecast
-    if all([[dt for dt in g_dts if dt in o_dts],
+    if all([set(g_dts).intersection(o_dts),
             abs(group['cat']) > abs(o_group['cat'])]):
 
         # Define 'bases' as values in the less extreme group
@@ -604,26 +653,15 @@ def get_score(changes, option, cat_weights, groups):
     score.
 
     Args:
-        changes (pandas.DataFrame): All non-duplicated changes
-        option: (pandas.DataFrame): Option for change groups
+        changes (numpy.ndarray): All non-duplicated changes
+        option: (numpy.ndarray): Option for change groups
         cat_weights (dict): Category changes and their weights
         groups: TEMPO/PROB groups based on option
     Returns:
         score (float): Combined performance score
     """
-    # Calculate closeness score
-    closeness = calc_close_score(changes, option, cat_weights)
-
-    # Calculate safety score
-    safety = calc_safe_score(changes, option)
-
-    # Calculate simplicity score
-    simplicity = calc_simple_score(groups)
-
-    # Combine all scores to get overall score
-    total_score = closeness * safety * simplicity
-
-    return total_score
+    return batch_get_score(changes, option[np.newaxis], cat_weights,
+                           [groups])[0]
 
 
 def get_vis_wx(values, bases, change_cat, rules):
@@ -682,7 +720,7 @@ def get_weights(chgs):
     Weights forecast categories by how often they are predicted.
 
     Args:
-        chgs (pandas.DataFrame): All non-duplicated changes
+        chgs (numpy.ndarray): All non-duplicated changes
     Returns:
         cat_weights (dict): Categories and their weights
         unq_cats (np.array): Unique categories forecast
@@ -735,7 +773,7 @@ def gust_change_row(row):
     return change
 
 
-def remove_duplicates(row):
+def remove_duplicates(changes):
     """
     Removes duplicate forecasts and keeps forecast that would lead to
     highest probability in the eventual TAF - e.g. if 60th and 70th
@@ -744,27 +782,31 @@ def remove_duplicates(row):
     will eventually be chosen.
 
     Args:
-        row (pandas.Series): Row of DataFrame
+        changes (dict): Arrays of changes for each percentile
     Returns:
-        row (pandas.Series): Updated row
+        unq_changes (dict): Updated arrays of changes
     """
+    unq_changes = dict(changes)
+
     # If 30th and 40th percentile change the same, just keep 40th
-    if row['40'] == row['30'] or row['50d'] == row['30']:
-        row['30'] = 0
+    unq_changes['30'] = np.where((changes['40'] == changes['30'])
+                                 | (changes['50d'] == changes['30']), 0,
+                                 changes['30'])
 
     # If 40th and 50th percentile change the same, just keep 50th
-    if row['50d'] == row['40']:
-        row['40'] = 0
+    unq_changes['40'] = np.where(changes['50d'] == changes['40'], 0,
+                                 changes['40'])
 
     # If 70th and 60th percentile change the same, just keep 60th
-    if row['60'] == row['70'] or row['50i'] == row['70']:
-        row['70'] = 0
+    unq_changes['70'] = np.where((changes['60'] == changes['70'])
+                                 | (changes['50i'] == changes['70']), 0,
+                                 changes['70'])
 
     # If 60th and 50th percentile change the same, just keep 50th
-    if row['50i'] == row['60']:
-        row['60'] = 0
+    unq_changes['60'] = np.where(changes['50i'] == changes['60'], 0,
+                                 changes['60'])
 
-    return row
+    return unq_changes
 
 
 def tempo_change(main_change, early_change, overlap_change, becmg_change,
@@ -4,19 +4,25 @@ Functions to create TEMPO and PROB groups.
 Functions:
     cover_all_changes: Creates single change group covering all changes.
     define_cols: Defines change categories columns.
+    extend_option: Extends all groups in option where possible.
     extend_period: Extends all groups by 1 hour if possible.
     extend_possible: Determines if change group extension possible.
     get_chg_values: Determines forecast values for change group.
+    get_group_values: Gets change groups with suitable values.
     get_param_bases: Extracts base values relevant to wx type.
+    get_perc_values: Gets arrays of values and bases for each percentile.
+    get_periods: Gets periods in which to look for TEMPO/PROB groups.
     get_suitable_values: Chooses values to use in change group.
+    min_tempos: Gets lower bound of number of TEMPO/PROB groups.
     one_percentile: Creates single percentile change group.
     optimal_changes: Finds best change group options.
     organise_groups: Organisise TEMPO/PROB groups into correct format.
     over_cats: Defines variables for overlapping groups.
     overlapping_groups: Finds option using overlapping change groups.
     param_tempos: Finds TEMPO/PROB groups for a given weather type.
+    period_changes: Finds significant changes between periods.
+    period_key: Gets key identifying PROB/TEMPO groups search.
     period_tempos: Finds TEMPO/PROB groups between periods.
-    update_options: Performs tests, adds option to options dictionary.
     values_bases: Collects values and base conditions relevant to group.
 """
 import copy
@@ -36,24 +42,19 @@ CHANGE_FUNCS = {'wind': tc.gust_change_row, 'vis': tc.vis_change_row,
                 'cld': tc.cld_change_row}
 
 
-def cover_all_changes(options, perc, unq_changes, unq_cats, change_inds,
-                      cat_weights, stdf):
+def cover_all_changes(perc, changes, unq_cats, change_inds):
     """
     Creates a change group option in which a single percentile is used
     to cover all category changes (either increased or decreased) by
-    just forecasting the most extreme category. Updates options
-    dictionary if necessary.
+    just forecasting the most extreme category.
 
     Args:
-        options (dict): Current change group options and their scores
         perc(str): Percentile being used to cover changes
-        unq_changes (pandas.DataFrame): All non-duplicated changes
+        changes (numpy.ndarray): All non-duplicated changes
         unq_cats (np.array): Unique non-zero categories to cover
-        change_inds (pandas.RangIndex): Indices where changes forecast
-        cat_weights (dict): Category changes and their weights
-        stdf (pandas.DataFrame): Subset of IMPROVER data
+        change_inds (numpy.ndarray): Indices where changes forecast
     Returns:
-        options (dict): Updated change group options and scores
+        x_options (list): Change group options (empty if no changes)
     """
     # Define relevant percentiles and most extreme change category,
     # depending on change type
@@ -62,23 +63,16 @@ def cover_all_changes(options, perc, unq_changes, unq_cats, change_inds,
     elif perc in ['70', '60', '50i']:
         x_cat = np.max(unq_cats)
 
-    # If changes are predicted and percentile is a relevant one...
-    if change_inds.any():
-
-        # Take copy of main changes dataframe and change all other
-        # percentile values to 0
-        x_changes = unq_changes.copy()
-        x_changes[x_changes.drop('time', axis=1).columns]=0
-
-        # Change all hours where changes are forecast to most extreme
-        # category
-        x_changes[perc].iloc[change_inds] = x_cat
+    # No option if no changes predicted
+    if not change_inds.any():
+        return []
 
-        # Test if option passes TAF rule tests, adding to options if so
-        options = update_options(options, unq_changes, x_changes, cat_weights,
-                                 stdf)
+    # Change all hours where changes are forecast to most extreme
+    # category, with all other values 0
+    x_changes = np.zeros(changes.shape, dtype=np.int8)
+    x_changes[change_inds, co.CHANGE_COLS.index(perc)] = x_cat
 
-    return options
+    return [x_changes]
 
 
 def define_cols(change_type):
@@ -103,23 +97,60 @@ def define_cols(change_type):
     return change_percs, changes_det
 
 
-def extend_period(stdf, groups_df, unq_changes, direction, check_length=False):
+def extend_option(stdf, option, unq_changes, perc_values, memo):
+    """
+    Extends all PROB/TEMPO groups in change group option where possible,
+    to create a safer TAF.
+
+    Args:
+        stdf (pandas.DataFrame): IMPROVER (and other) data
+        option (numpy.ndarray): PROB/TEMPO groups category changes
+        unq_changes (pandas.DataFrame): All non-duplicated changes
+        perc_values (dict): Arrays of values and base conditions for
+                            each percentile
+        memo (dict): Suitable values already found for each category
+    Returns:
+        option (numpy.ndarray): Updated TEMPO/PROB groups category
+                                changes
+    """
+    # Extend change group periods by an hour in each direction
+    option = extend_period(stdf, option, unq_changes, perc_values, memo,
+                           'back')
+    option = extend_period(stdf, option, unq_changes, perc_values, memo,
+                           'forward')
+
+    # Try to extend further for groups < 2 hours
+    option = extend_period(stdf, option, unq_changes, perc_values, memo,
+                           'back', check_length=True)
+    option = extend_period(stdf, option, unq_changes, perc_values, memo,
+                           'forward', check_length=True)
+
+    return option
+
+
+def extend_period(stdf, option, unq_changes, perc_values, memo, direction,
+                  check_length=False):
     """
     Extends all PROB/TEMPO groups, either by 1 hour back in time or 1
     hours forward in time if possible.
 
     Args:
         stdf (pandas.DataFrame): IMPROVER (and other) data
-        groups (dict): TEMPO/PROB groups
-        groups_df (pandas.DataFrame): PROB/TEMPO groups category changes
+        option (numpy.ndarray): PROB/TEMPO groups category changes
+        unq_changes (pandas.DataFrame): All non-duplicated changes
+        perc_values (dict): Arrays of values and base conditions for
+                            each percentile
+        memo (dict): Suitable values already found for each category
         direction (str): Direction to extend group (forward/back)
         check_length (bool): Indicator for whether to ensure length of
                              group is at least 2 hours
     Returns:
-        groups (list): Updated list of TEMPO/PROB groups
+        option (numpy.ndarray): Updated TEMPO/PROB groups category
+                                changes
     """
-    # Get groups based on dataframe
-    groups = get_chg_values(stdf, groups_df, unq_changes)
+    # Get groups based on option (change types not needed here)
+    groups = get_group_values(stdf, option, unq_changes, perc_values, memo)
+    times = list(unq_changes['time'])
 
     # Iterate through each change group
     for group_key, group in groups.items():
@@ -129,43 +160,43 @@ def extend_period(stdf, groups_df, unq_changes, direction, check_length=False):
         if check_length and (end - start).total_seconds() / 3600 >= 2:
             continue
 
-        # Get new dt to test adding to dataframe (N.B. PROB/TEMPO
-        # periods end 1 hour after latest change in dataframe so new dt
-        # for extending forward is dt at the end of the current period)
+        # Get new dt to test adding to option (N.B. PROB/TEMPO periods
+        # end 1 hour after latest change in option so new dt for
+        # extending forward is dt at the end of the current period)
         if direction == 'back':
             new_dt = group['period'][0] - timedelta(hours=1)
         elif direction == 'forward':
             new_dt = group['period'][1]
 
         # Can't extend if new dt is out of searching period
-        if not groups_df['time'].isin([new_dt]).any():
+        if new_dt not in times:
             continue
 
-        # Get stdf at time and group percentile and convert to Series
-        t_stdf = stdf[stdf['time'] == new_dt]
-        tp_stdf = t_stdf[t_stdf['percentile'] == int(group['perc'][:2])]
-        tp_row = tp_stdf.squeeze()
-
-        # Take copy of dataframe to avoid overwriting
-        ext_df = groups_df.copy()
-
         # Can't extend if non-zero category already in new time position
-        if ext_df.loc[ext_df.time == new_dt, group['perc']].values[0] != 0:
+        t_ind, p_ind = times.index(new_dt), co.CHANGE_COLS.index(group['perc'])
+        if option[t_ind, p_ind] != 0:
             continue
 
-        # If new time category is zero, change category
-        ext_df.loc[ext_df.time == new_dt, group['perc']] = group['cat']
+        # If new time category is zero, change category (taking copy to
+        # avoid overwriting)
+        ext_option = option.copy()
+        ext_option[t_ind, p_ind] = group['cat']
 
         # Don't make changes if adding change creates an illegal TAF
-        if not tc.changes_tests(ext_df):
+        if not tc.changes_tests(ext_option):
             continue
 
-        # If possible to extend, commit to changing groups df
+        # Get stdf at time and group percentile and convert to Series
+        t_stdf = stdf[stdf['time'] == new_dt]
+        tp_stdf = t_stdf[t_stdf['percentile'] == int(group['perc'][:2])]
+        tp_row = tp_stdf.squeeze()
+
+        # If possible to extend, commit to changing option
         if extend_possible(group_key, group, groups, tp_row,
                            stdf.attrs['wx_type']):
-            groups_df = ext_df
+            option = ext_option
 
-    return groups_df
+    return option
 
 
 def extend_possible(group_key, group, groups, tp_row, wx_type):
@@ -211,30 +242,68 @@ def extend_possible(group_key, group, groups, tp_row, wx_type):
     return extend
 
 
-def get_chg_values(stdf, groups_df, changes_df):
+def get_chg_values(stdf, option, changes_df, perc_values, memo=None):
     """
     Determines suitable forecast values for a change group and collects
     TEMPO/PROB group information into dictionary.
 
     Args:
         stdf (pandas.DataFrame): Subset of IMPROVER data
-        groups_df (pandas.DataFrame): Categories for change groups.
+        option (numpy.ndarray): Categories for change groups.
+        changes_df (pandas.DataFrame): All unique changes.
+        perc_values (dict): Arrays of values and base conditions for
+                            each percentile
+        memo (dict): Suitable values already found for each category
+    Returns:
+        groups (list): List of TEMPO/PROB groups
+    """
+    # Get change groups with finalised values
+    groups = get_group_values(stdf, option, changes_df, perc_values,
+                              {} if memo is None else memo)
+
+    # Now all values finalised, choose suitable change group type (i.e.
+    # TEMPO or no TEMPO)
+    for group in groups.values():
+        group['change_type'] = tc.tempo_no_tempo(group, changes_df,
+                                                 stdf.attrs['wx_type'])
+
+    return groups
+
+
+def get_group_values(stdf, option, changes_df, perc_values, memo):
+    """
+    Gets change groups from option and determines suitable forecast
+    values for each of them. Values only depend on the change category
+    (not the group period), so are found once for each category and
+    stored in memo, making it cheap to re-derive groups as their
+    periods are extended.
+
+    Args:
+        stdf (pandas.DataFrame): Subset of IMPROVER data
+        option (numpy.ndarray): Categories for change groups.
         changes_df (pandas.DataFrame): All unique changes.
+        perc_values (dict): Arrays of values and base conditions for
+                            each percentile
+        memo (dict): Suitable values already found for each category
     Returns:
         groups (list): List of TEMPO/PROB groups
     """
-    # Get change groups from groups dataframe
-    groups = tc.get_groups(groups_df)
+    # Get change groups from option
+    groups = tc.get_groups(option, list(changes_df['time']))
 
     # loop through each group
     for group in groups.values():
 
-        # Get relevant values and base conditions
-        values, bases = values_bases(changes_df, stdf, group)
+        # Get relevant values and base conditions and choose suitable
+        # set of values to use if not already found for category
+        if group['cat'] not in memo:
+            values, bases = values_bases(changes_df, stdf, perc_values,
+                                         group)
+            memo[group['cat']] = get_suitable_values(values, bases,
+                                                     group['cat'], stdf)
 
-        # Choose suitable set of values to use
-        group['values'] = get_suitable_values(values, bases, group['cat'],
-                                              stdf)
+        # Take copy as values may be adjusted for overlapping groups
+        group['values'] = copy.deepcopy(memo[group['cat']])
 
     # For overlapping groups, ensure group with most extreme forecast is
     # significantly different from group with less extreme forecast -
@@ -257,12 +326,6 @@ def get_chg_values(stdf, groups_df, changes_df):
                                                  group['cat'], o_bases,
                                                  stdf.attrs['rules'])
 
-    # Now all values finalised, choose suitable change group type (i.e.
-    # TEMPO or no TEMPO)
-    for group in groups.values():
-        group['change_type'] = tc.tempo_no_tempo(group, changes_df,
-                                                 stdf.attrs['wx_type'])
-
     return groups
 
 
@@ -300,6 +363,93 @@ def get_param_bases(base_dict, wx_type):
     return p_bases
 
 
+def get_perc_values(stdf):
+    """
+    Gets arrays of forecast values and base conditions relevant to wx
+    type for each percentile, with rows in the same order as in stdf.
+
+    Args:
+        stdf (pandas.DataFrame): Subset of IMPROVER data
+    Returns:
+        perc_values (dict): Arrays of values and base conditions for
+                            each percentile
+    """
+    # Columns containing forecast values and base conditions
+    cols = []
+    for param in co.PARAM_NAMES[stdf.attrs['wx_type']]:
+        cols += [param, f'base_{param}', f'base_{param}_2']
+
+    # Split each column by percentile (keeping original dtypes)
+    percs = stdf['percentile'].to_numpy()
+    perc_values = {}
+    for perc in np.unique(percs):
+        perc_values[int(perc)] = {col: stdf[col].to_numpy()[percs == perc]
+                                  for col in cols}
+
+    return perc_values
+
+
+def get_periods(tdf, change_groups, wx_type):
+    """
+    Gets periods between base/BECMG periods in which to look for TEMPO
+    or PROB groups for a weather type, with relevant base conditions.
+
+    Args:
+        tdf (pandas.DataFrame): IMPROVER data
+        change_groups (list): Base conditions and change groups
+        wx_type: (str): Weather type of TEMPO/PROB groups to look for
+    Returns:
+        periods (list): Base/BECMG group, main base conditions, early
+                        base conditions and end of search period for
+                        each period
+    """
+    # Get base conditions and BECMG groups relevant to weather type
+    wx_changes = [grp for grp in change_groups if grp['change_type'] == 'base'
+                  or any(wx_type in chg for chg in grp['wx_changes'])]
+
+    # Iterate through wx change groups
+    periods = []
+    for ind, change in enumerate(wx_changes):
+
+        # If not the last group, need to consider following BECMG group
+        if ind != len(wx_changes) - 1:
+
+            # Define change period and following change period
+            change_period = change['change_period']
+            next_change_period = wx_changes[ind + 1]['change_period']
+
+            # Special case if main base is initial base conditions and
+            # BECMG group starts at start of TAF - no room for
+            # PROB/TEMPO groups here so move to next iteration
+            if change_period[0] == next_change_period[0]:
+                continue
+
+            # End of period to look for PROB/TEMPO groups is 1 hour
+            # before start of next BECMG period
+            end_dt = next_change_period[0] - timedelta(hours=1)
+
+        # If no following BECMG groups, end dt 1 hour before end of TAF
+        else:
+            end_dt = tdf['time'].unique()[-2]
+
+        # Main base conditions defined in change group - take copy to
+        # avoid overwriting later
+        main_base = copy.deepcopy(change)
+
+        # If BECMG group, need to consider earlier base conditions to
+        # allow groups to overlap with BECMG group if necessary
+        if ind != 0:
+            early_base = copy.deepcopy(wx_changes[ind - 1])
+
+        # If no more BECMG groups follow, ignore early_base
+        else:
+            early_base = None
+
+        periods.append((change, main_base, early_base, end_dt))
+
+    return periods
+
+
 def get_suitable_values(values, bases, change_cat, stdf):
     """
     Finds appropriate values to use in change groups, tweaking to ensure
@@ -351,89 +501,147 @@ def get_suitable_values(values, bases, change_cat, stdf):
     return suitable_values
 
 
-def one_percentile(options, unq_changes, perc, cat_weights, stdf):
+def min_tempos(tdf, change_groups):
+    """
+    Gets lower bound of number of TEMPO/PROB groups in TAF, without
+    searching for groups. If any significant changes are found at times
+    with changes at all percentiles, at least one option for groups
+    will pass the tests in tc.changes_tests (a single percentile option)
+    and merging groups never removes all of them.
+
+    Args:
+        tdf (pandas.DataFrame): IMPROVER data
+        change_groups (list): Base conditions and BECMG groups
+    Returns:
+        min_groups (int): Minimum number of TEMPO/PROB groups
+    """
+    # Look for significant changes in each period for each weather type
+    for wx_type in ['wind', 'vis', 'cld']:
+        tdf.attrs['wx_type'] = wx_type
+        for _, main_base, early_base, end_dt in get_periods(tdf,
+                                                            change_groups,
+                                                            wx_type):
+
+            # Move on if no TEMPO/PROB groups necessary (as in
+            # period_tempos)
+            stdf = period_changes(main_base, early_base, end_dt, tdf)
+            if stdf['change'].sum() == 0:
+                continue
+
+            # At least one group needed if changes at all percentiles
+            unq_changes = tc.get_changes(stdf)
+            if unq_changes[co.CHANGE_COLS].to_numpy().any():
+                return 1
+
+    return 0
+
+
+def one_percentile(changes, perc):
     """
     Creates change group option in which a single percentile's forecasts
-    are used and updates options dictionary if necessary.
+    are used.
 
     Args:
-        options (dict): Current change group options and their scores
-        unq_changes (pandas.DataFrame): All non-duplicated changes
+        changes (numpy.ndarray): All non-duplicated changes
         perc (str): Percentile from which change group will be based on
-        cat_weights (dict): Category changes and their weights
-        stdf (pandas.DataFrame): Subset of IMPROVER data
     Returns:
-        options (dict): Updated change group options and scores
+        changes_perc (numpy.ndarray): Change group option
     """
-    # Take copy of main changes dataframe and change all other
-    # percentile changes to zero (remove time column temporarily)
-    changes_perc = unq_changes.copy()
-    cols = [col for col in changes_perc.columns if col not in ['time', perc]]
-    changes_perc.loc[:, cols] = 0
-
-    # Test against TAF rules, calculate scores and add to options
-    options = update_options(options, unq_changes, changes_perc, cat_weights,
-                             stdf)
+    # Keep changes at percentile, changing all other percentile changes
+    # to zero
+    p_ind = co.CHANGE_COLS.index(perc)
+    changes_perc = np.zeros(changes.shape, dtype=np.int8)
+    changes_perc[:, p_ind] = changes[:, p_ind]
 
-    return options
+    return changes_perc
 
 
-def optimal_changes(stdf):
+def optimal_changes(stdf, perc_values):
     """
     Finds best change group options for representing forecast changes.
+    Options are int8 arrays (row for each time and column for each of
+    co.CHANGE_COLS), tested and scored together, with only the best
+    option converted into change groups.
 
     Args:
         stdf (pandas.DataFrame): Subset of IMPROVER and airport data
+        perc_values (dict): Arrays of values and base conditions for
+                            each percentile
     Returns:
         best_option (pandas.DataFrame): Best change group option
     """
     # Get smaller dataframe just containing changes at all percentiles
+    # and array of changes without time column
     unq_changes = tc.get_changes(stdf)
-
-    # Take copy with time column removed
-    unq_no_time = unq_changes.drop(['time'], axis=1)
+    changes = unq_changes[co.CHANGE_COLS].to_numpy()
 
     # Get category weights based on frequency of forecasts - used for
     # calculating scores later
-    cat_weights, unq_cats = tc.get_weights(unq_no_time)
-
-    # For adding change group options to
-    options = []
-
-    # Test against TAF rules, calculate scores and add to options
-    option = unq_changes.copy()
-    options = update_options(options, unq_changes, option, cat_weights, stdf)
+    cat_weights, unq_cats = tc.get_weights(changes)
 
     # Indices of decreased and increased changes
-    dec_inds = unq_no_time[(unq_no_time < 0).any(axis=1)].index
-    inc_inds = unq_no_time[(unq_no_time > 0).any(axis=1)].index
+    dec_inds = np.flatnonzero((changes < 0).any(axis=1))
+    inc_inds = np.flatnonzero((changes > 0).any(axis=1))
+
+    # Start with option using all changes
+    options = [changes.astype(np.int8)]
 
     # Find options that use a single percentile column
-    for perc in unq_no_time.columns:
+    for perc in co.CHANGE_COLS:
 
-        # Create simple option just using changes from one percentile,
-        # calculating scores and adding to options if necessary
-        options = one_percentile(options, unq_changes, perc, cat_weights, stdf)
+        # Create simple option just using changes from one percentile
+        options.append(one_percentile(changes, perc))
 
         # Create options that cover extreme changes using single
         # percentile if possible
-        options = cover_all_changes(options, perc, unq_changes, unq_cats,
-                                    dec_inds, cat_weights, stdf)
-        options = cover_all_changes(options, perc, unq_changes, unq_cats,
-                                    inc_inds, cat_weights, stdf)
+        options += cover_all_changes(perc, changes, unq_cats, dec_inds)
+        options += cover_all_changes(perc, changes, unq_cats, inc_inds)
 
     # Create options for overlapping groups (TEMPO and PROB) if possible
-    options = overlapping_groups(options, unq_cats[unq_cats < 0], unq_changes,
-                                 dec_inds, cat_weights, 'decrease', stdf)
-    options = overlapping_groups(options, unq_cats[unq_cats > 0], unq_changes,
-                                 inc_inds, cat_weights, 'increase', stdf)
+    options += overlapping_groups(unq_cats[unq_cats < 0], changes, dec_inds,
+                                  'decrease')
+    options += overlapping_groups(unq_cats[unq_cats > 0], changes, inc_inds,
+                                  'increase')
+
+    # Test all options against TAF rules at once, ignoring repeated
+    # options as they give the same result
+    passed = tc.batch_changes_tests(np.stack(options))
+    viable_options, tested = [], set()
+    for option, option_passed in zip(options, passed):
+        if option_passed and option.tobytes() not in tested:
+            tested.add(option.tobytes())
+            viable_options.append(option)
+
+    # Extend change group periods if possible to create a safer TAF,
+    # sharing group values between options as they only depend on the
+    # change category
+    memo = {}
+    viable_options = [extend_option(stdf, option, unq_changes, perc_values,
+                                    memo)
+                      for option in viable_options]
 
     # If no viable options, return empty dictionary
-    if not options:
+    if not viable_options:
         return {}
 
-    # Choose option with highest overall score as best option
-    best_groups = max(options, key=lambda x: x['score'])['groups']
+    # Double check all tests still passed
+    viable_stack = np.stack(viable_options)
+    assert tc.batch_changes_tests(viable_stack).all(), (
+        ' Tests not passed in adapted option'
+    )
+
+    # Get performance scores of all options at once (only depends on
+    # group periods) and choose option with highest score (the first if
+    # tied)
+    times = list(unq_changes['time'])
+    groups_list = [tc.get_groups(option, times) for option in viable_options]
+    scores = tc.batch_get_score(changes, viable_stack, cat_weights,
+                                groups_list)
+    best_option = viable_options[np.argmax(scores)]
+
+    # Get groups with values for best option
+    best_groups = get_chg_values(stdf, best_option, unq_changes, perc_values,
+                                 memo)
 
     return best_groups
 
@@ -502,66 +710,59 @@ def organise_groups(groups, main_base, wx_type, end_dt):
     return probs_tempos
 
 
-def overlapping_groups(options, change_cats, unq_changes, change_inds,
-                       cat_weights, change_type, stdf):
+def overlapping_groups(change_cats, changes, change_inds, change_type):
     """
-    Finds change group option using overlapping groups (e.g. TEMPO and
-    PROB30 TEMPO) and updates options dictionary if necessary.
+    Finds change group options using overlapping groups (e.g. TEMPO and
+    PROB30 TEMPO).
 
     Args:
-        options (dict): Current change group options and their scores
         change_cats (list): Change categories forecast
-        unq_changes (pandas.DataFrame): Non-duplicated forecast changes
-        change_inds (pandas.RangeIndex): Indices where changes forecast
-        cat_weights (dict): Category changes and their weights
+        changes (numpy.ndarray): Non-duplicated forecast changes
+        change_inds (numpy.ndarray): Indices where changes forecast
         change_type (str): Type of change (increase or decrease)
-        stdf (pandas.DataFrame): Subset of IMPROVER data
     Returns:
-        options (dict): Updated change group options and scores
+        over_options (list): Change group options
     """
     # Overlapping groups only possible when at least 2 change categories
     if not change_inds.any() or len(change_cats) < 2:
-        return options
-
-    # Get all percentile columns (exclude time)
-    p_cols = unq_changes.drop('time', axis=1).columns
+        return []
 
     # Determine categories to use
     x_cat, l_cats_x_inds = over_cats(change_type, change_cats, change_inds,
-                                     unq_changes, p_cols)
+                                     changes)
 
     # Define columns to use - depends on change type
     changes_percs, changes_det = define_cols(change_type)
+    det_ind = co.CHANGE_COLS.index(changes_det)
 
     # Test overlapping with PROB30 and PROB40, covering range of less
     # extreme categories
+    over_options = []
     for perc, l_cat in itertools.product(changes_percs, l_cats_x_inds):
 
         # Only use l_cat if some forecasts in that category
-        if not (unq_changes==l_cat).any(axis=None):
+        if not (changes == l_cat).any():
             continue
 
         # Create option for each extreme indices option
         for x_inds in l_cats_x_inds[l_cat]:
 
-            # Get copy of unique changes filled with zeros
-            changes_over = unq_changes.copy()
-            changes_over[p_cols] = 0
+            # Start with array filled with zeros
+            changes_over = np.zeros(changes.shape, dtype=np.int8)
 
             # Cover whole period with least extreme category
-            changes_over[changes_det].iloc[change_inds] = l_cat
+            changes_over[change_inds, det_ind] = l_cat
 
             # Change relevent indices to most severe category
-            changes_over[perc].iloc[x_inds] = x_cat
+            changes_over[x_inds, co.CHANGE_COLS.index(perc)] = x_cat
 
-            # If tests passed, add to options
-            options = update_options(options, unq_changes, changes_over,
-                                     cat_weights, stdf)
+            # Add to options
+            over_options.append(changes_over)
 
-    return options
+    return over_options
 
 
-def over_cats(change_type, change_cats, change_inds, unq_changes, p_cols):
+def over_cats(change_type, change_cats, change_inds, changes):
     """
     Determines categories to use for overlapping groups. There can be
     many possible options for this if there are many categories to
@@ -577,9 +778,8 @@ def over_cats(change_type, change_cats, change_inds, unq_changes, p_cols):
     Args:
         change_type (str): Type of change (increase or decrease)
         change_cats (list): Change categories forecast
-        change_inds (pandas.RangeIndex): Indices where changes forecast
-        unq_changes (pandas.DataFrame): Non-duplicated forecast changes
-        p_cols (list): Percentile columns
+        change_inds (numpy.ndarray): Indices where changes forecast
+        changes (numpy.ndarray): Non-duplicated forecast changes
     Returns:
         x_cat (int): Most extreme category to use in overlapping PROB
                      group
@@ -608,8 +808,7 @@ def over_cats(change_type, change_cats, change_inds, unq_changes, p_cols):
 
                 # Collect indices for category being considered as well
                 # as indices of more extreme categories
-                x_inds = [ind for ind in change_inds
-                          if unq_changes.iloc[ind][p_cols].min() <= cat]
+                x_inds = change_inds[changes[change_inds].min(axis=1) <= cat]
                 x_inds_options.append(x_inds)
 
             # Add to dictionary using l_cat as key and x_inds_options as
@@ -634,8 +833,7 @@ def over_cats(change_type, change_cats, change_inds, unq_changes, p_cols):
 
                 # Collect indices for category being considered as well
                 # as indices of more extreme categories
-                x_inds = [ind for ind in change_inds
-                          if unq_changes.iloc[ind][p_cols].max() >= cat]
+                x_inds = change_inds[changes[change_inds].max(axis=1) >= cat]
                 x_inds_options.append(x_inds)
 
             # Add to dictionary using l_cat as key and x_inds_options as
@@ -645,7 +843,7 @@ def over_cats(change_type, change_cats, change_inds, unq_changes, p_cols):
     return x_cat, l_cats_x_inds
 
 
-def param_tempos(tdf, change_groups, wx_type):
+def param_tempos(tdf, change_groups, wx_type, memo):
     """
     Finds TEMPO or PROB groups for a weather type (wind, vis/wx, gust).
 
@@ -653,55 +851,26 @@ def param_tempos(tdf, change_groups, wx_type):
         tdf (pandas.DataFrame): IMPROVER data
         change_groups (list): Base conditions and change groups
         wx_type: (str): Weather type of TEMPO/PROB groups to look for
+        memo (dict): PROB/TEMPO groups already found for IMPROVER data,
+                     keyed by weather type, base conditions and period
     Returns:
         change_groups (list): Updated base conditions and change groups
     """
     # Add weather type as attribute to dataframe
     tdf.attrs['wx_type'] = wx_type
 
-    # Get base conditions and BECMG groups relevant to weather type
-    wx_changes = [grp for grp in change_groups if grp['change_type'] == 'base'
-                  or any(wx_type in chg for chg in grp['wx_changes'])]
-
-    # Iterate through wx change groups
-    for ind, change in enumerate(wx_changes):
-
-        # If not the last group, need to consider following BECMG group
-        if ind != len(wx_changes) - 1:
-
-            # Define change period and following change period
-            change_period = change['change_period']
-            next_change_period = wx_changes[ind + 1]['change_period']
-
-            # Special case if main base is initial base conditions and
-            # BECMG group starts at start of TAF - no room for
-            # PROB/TEMPO groups here so move to next iteration
-            if change_period[0] == next_change_period[0]:
-                continue
-
-            # End of period to look for PROB/TEMPO groups is 1 hour
-            # before start of next BECMG period
-            end_dt = next_change_period[0] - timedelta(hours=1)
-
-        # If no following BECMG groups, end dt 1 hour before end of TAF
-        else:
-            end_dt = tdf['time'].unique()[-2]
+    # Iterate through periods between base/BECMG groups
+    for change, main_base, early_base, end_dt in get_periods(tdf,
+                                                             change_groups,
+                                                             wx_type):
 
-        # Main base conditions defined in change group - take copy to
-        # avoid overwriting later
-        main_base = copy.deepcopy(change)
-
-        # If BECMG group, need to consider earlier base conditions to
-        # allow groups to overlap with BECMG group if necessary
-        if ind != 0:
-            early_base = copy.deepcopy(wx_changes[ind - 1])
-
-        # If no more BECMG groups follow, ignore early_base
-        else:
-            early_base = None
-
-        # Look for PROB/TEMPO groups over this period
-        probs_tempos = period_tempos(main_base, early_base, end_dt, tdf)
+        # Look for PROB/TEMPO groups over this period, reusing groups
+        # found for other BECMG options with the same base conditions
+        # and period (taking copy as groups are updated later)
+        key = period_key(main_base, early_base, end_dt, wx_type)
+        if key not in memo:
+            memo[key] = period_tempos(main_base, early_base, end_dt, tdf)
+        probs_tempos = copy.deepcopy(memo[key])
 
         # Add in main base info for each group and fix probs for
         # overlapping groups (for merging groups later)
@@ -721,9 +890,10 @@ def param_tempos(tdf, change_groups, wx_type):
     return change_groups
 
 
-def period_tempos(main_base, early_base, end_dt, tdf):
+def period_changes(main_base, early_base, end_dt, tdf):
     """
-    Finds TEMPO or PROB groups between base/BECMG periods.
+    Finds significant changes from base conditions between base/BECMG
+    periods.
 
     Args:
         main_base (dict): Main base conditions
@@ -731,7 +901,8 @@ def period_tempos(main_base, early_base, end_dt, tdf):
         end_dt (cftime): End of seach period time
         tdf (pandas.DataFrame): IMPROVER and airport data
     Returns:
-        probs_tempos (list): Change groups found
+        stdf (pandas.DataFrame): Subset of IMPROVER data with base
+                                 conditions and significant changes
     """
     # Get start of searching period
     start_dt = main_base['change_period'][0]
@@ -772,74 +943,69 @@ def period_tempos(main_base, early_base, end_dt, tdf):
     # Find significant changes by comparing to base condtions
     stdf['change'] = stdf.apply(CHANGE_FUNCS[tdf.attrs['wx_type']], axis=1)
 
-    # If no significant changes found, no TEMPO/PROB groups necessary
-    if stdf['change'].sum() == 0:
-        return []
-
-    # Get dataframe of optimal changes for each percentile that will be
-    # used to generate change groups (add weather type to stdf metadata)
-    groups = optimal_changes(stdf)
-
-    # Finally, organise change group info into correct format
-    probs_tempos = organise_groups(groups, main_base, stdf.attrs['wx_type'],
-                                   end_dt)
-
-    return probs_tempos
+    return stdf
 
 
-def update_options(options, unq_changes, option, cat_weights, stdf):
+def period_key(main_base, early_base, end_dt, wx_type):
     """
-    Checks if change group option passes TAF rules tests and (if so)
-    adds to options dictionary.
+    Gets key identifying everything that PROB/TEMPO groups between
+    base/BECMG periods depend on, other than the IMPROVER data.
 
     Args:
-        options (dict): Current change group options and their scores
-        unq_changes (pandas.DataFrame): Non-duplicated forecast changes
-        option (pandas.DataFrame): Change group option
-        cat_weights (dict): Category changes and their weights
-        stdf (pandas.DataFrame): Subset of IMPROVER data
+        main_base (dict): Main base conditions
+        early_base (dict): Base conditions before BECMG group
+        end_dt (cftime): End of seach period time
+        wx_type (str): Weather type (wind, vis or cld)
     Returns:
-        options (dict): Updated change group options and scores
+        key (tuple): Key identifying PROB/TEMPO groups search
     """
-    # Take copy of option as it may be updated
-    option_cp = option.copy()
+    # All main base conditions (including change period) are used
+    main_key = repr(sorted(main_base.items()))
 
-    # Check if option passes tests
-    taf_rules_check = tc.changes_tests(option_cp)
+    # Only base values relevant to wx type are used from early bases
+    early_key = repr(get_param_bases(early_base, wx_type))
 
-    # If tests failed, do not add to options
-    if not taf_rules_check:
-        return options
+    key = (wx_type, main_key, early_key, end_dt)
 
-    # Extend change group periods if possible to create a safer TAF
-    option_cp = extend_period(stdf, option_cp, unq_changes, 'back')
-    option_cp = extend_period(stdf, option_cp, unq_changes, 'forward')
+    return key
 
-    # Try to extend further for groups < 2 hours
-    option_cp = extend_period(stdf, option_cp, unq_changes, 'back',
-                              check_length=True)
-    option_cp = extend_period(stdf, option_cp, unq_changes, 'forward',
-                              check_length=True)
 
-    # If removing changes leaves all zeros, don't update options
-    num_changes = np.count_nonzero(option_cp.drop('time', axis=1))
-    if not num_changes:
-        return options
+def period_tempos(main_base, early_base, end_dt, tdf):
+    """
+    Finds TEMPO or PROB groups between base/BECMG periods.
 
-    # Get groups again using updated option df
-    groups = get_chg_values(stdf, option_cp, unq_changes)
+    Args:
+        main_base (dict): Main base conditions
+        early_base (dict): Base conditions before BECMG group
+        end_dt (cftime): End of seach period time
+        tdf (pandas.DataFrame): IMPROVER and airport data
+    Returns:
+        probs_tempos (list): Change groups found
+    """
+    # Get subset of IMPROVER data with significant changes from base
+    # conditions
+    stdf = period_changes(main_base, early_base, end_dt, tdf)
 
-    # Double check all tests still passed
-    assert tc.changes_tests(option_cp), ' Tests not passed in adapted option'
+    # If no significant changes found, no TEMPO/PROB groups necessary
+    if stdf['change'].sum() == 0:
+        return []
 
-    # Get performance score and add to options
-    score = tc.get_score(unq_changes, option_cp, cat_weights, groups)
-    options.append({'score': score, 'groups': groups})
+    # Get arrays of values and base conditions for each percentile to
+    # avoid repeatedly filtering stdf when finding group values
+    perc_values = get_perc_values(stdf)
 
-    return options
+    # Get dataframe of optimal changes for each percentile that will be
+    # used to generate change groups (add weather type to stdf metadata)
+    groups = optimal_changes(stdf, perc_values)
+
+    # Finally, organise change group info into correct format
+    probs_tempos = organise_groups(groups, main_base, stdf.attrs['wx_type'],
+                                   end_dt)
+
+    return probs_tempos
 
 
-def values_bases(changes_df, stdf, group):
+def values_bases(changes_df, stdf, perc_values, group):
     """
     Collects values relevant to group. Also collects relevant base
     conditions.
@@ -847,6 +1013,8 @@ def values_bases(changes_df, stdf, group):
     Args:
         changes_df (pandas.DataFrame): Forecast changes
         stdf (pandas.DataFrame): Subset of IMPROVER data
+        perc_values (dict): Arrays of values and base conditions for
+                            each percentile
         group (dict): Change group info
     Returns:
         values (dict): Possible values to use in change group
@@ -858,30 +1026,28 @@ def values_bases(changes_df, stdf, group):
 
     # Find values for each point in IMPROVER data for which category
     # in group is forecast
-    for perc_str, col in changes_df.items():
+    for perc_str in co.CHANGE_COLS:
 
         # Move on if no forecasts of change group category
-        if col[col == group['cat']].empty:
+        inds = np.flatnonzero(changes_df[perc_str].to_numpy() == group['cat'])
+        if not inds.size:
             continue
 
-        # Get data at percentile and reset index
-        perc_df = stdf[stdf['percentile'] == int(perc_str[:2])]
-        perc_df.reset_index(drop=True, inplace=True)
+        # Get data at percentile
+        p_values = perc_values[int(perc_str[:2])]
 
         # Get values and base conditions at indices at which change
         # category is predicted
-        for ind, _ in col[col == group['cat']].items():
-
-            # Add required values and bases
-            for param in bases:
+        for param in bases:
 
-                # Add IMPROVER values
-                values[param].append(perc_df.loc[ind][param])
+            # Add IMPROVER values
+            values[param].extend(p_values[param][inds])
 
-                # Add base values (could be more than 1 for each
-                # parameter if group overlaps with BECMG period)
+            # Add base values (could be more than 1 for each parameter
+            # if group overlaps with BECMG period)
+            for ind in inds:
                 for base_col in [f'base_{param}', f'base_{param}_2']:
-                    if perc_df.loc[ind][base_col] not in bases[param]:
-                        bases[param].append(perc_df.loc[ind][base_col])
+                    if p_values[base_col][ind] not in bases[param]:
+                        bases[param].append(p_values[base_col][ind])
 
     return values, bases
@@ -14,10 +14,12 @@ Functions:
     mp_queue: Wrapper function for multiprocessing.
     round_cld: Rounds cloud appropriately.
     round_vis: Rounds visibility appropriately.
+    timed_call: Calls function and times how long it takes.
     use_cavok: Determines whether CAVOK/NSC/NSW is needed.
 """
 import math
 import sys
+import time
 from datetime import datetime, timedelta
 
 from dateutil.rrule import HOURLY, rrule
@@ -534,6 +536,25 @@ def round_vis(vis, rules):
     return rounded_vis
 
 
+def timed_call(target_func, args):
+    """
+    Calls function, timing how long it takes. Useful for timing tasks
+    run in other processes.
+
+    Args:
+        target_func (function): Function to call
+        args (list): List of arguments for function
+    Returns:
+        result: Output of function
+        elapsed (float): Time taken in seconds
+    """
+    start = time.perf_counter()
+    result = target_func(*args)
+    elapsed = time.perf_counter() - start
+
+    return result, elapsed
+
+
 def use_cavok(vis, clds, sig_wx, wx_changes, prev_wx=None):
     """
     Determines whether CAVOK/NSC/NSW is needed.
@@ -8,12 +8,20 @@ Functions:
     check_vis_cld_wind: Adjusts visibility based on cloud and wind.
     check_vis_sig_wx: Adjusts visibility based on sig wx.
     cld_change: Checks for significant cloud changes.
+    cld_change_col: Checks for significant cloud changes in arrays.
     dir_change: Checks if difference in wind direction significant.
+    dir_change_col: Checks for significant wind dir changes in arrays.
     gust_change: Checks for significant gust changes.
+    gust_change_col: Checks for significant gust changes in arrays.
     mean_change: Checks for significant wind mean changes.
+    mean_change_col: Checks for significant mean changes in arrays.
+    sig_wx_vis_limit: Determines visibility limit for sig wx code.
     vis_based_wx: Adjusts wx codes based on visibility.
     vis_change: Checks for significant visibility changes.
+    vis_change_col: Checks for significant vis changes in arrays.
 """
+import numpy as np
+
 import common.calculations as ca
 import common.configs as co
 
@@ -212,12 +220,9 @@ def check_vis_cld_wind(vis, cld_5, wind_mean):
         vis (int): Updated visibility value
     """
     # Define rules depending on cloud base height
-    if cld_5 < 100:
-        rules =  {'wind': [3, 6, 10, 15], 'vis': [300, 800, 1400, 3000, 5000]}
-    elif cld_5 < 200:
-        rules =  {'wind': [5, 10, 15], 'vis': [1200, 3000, 5000, 9000]}
-    elif cld_5 < 400:
-        rules = {'wind': [5, 10], 'vis': [5000, 9000, 9999]}
+    for cld_limit, rules in co.VIS_CLD_WIND_RULES.items():
+        if cld_5 < cld_limit:
+            break
     else:
         return vis
 
@@ -246,40 +251,12 @@ def check_vis_sig_wx(sig_wx, vis):
     Return:
         vis (int): Updated visibility value
     """
-    # Leave unadjusted for non-precip codes
-    if sig_wx in co.NON_PRECIP_CODES:
-        return vis
-
-    # Determine precip rate
-    rate = ca.get_rate(sig_wx)
-
-    # Define rates used
-    test_rates = ['light', 'moderate', 'heavy']
-
-    # Covers all codes including rain
-    if 'RA' in sig_wx:
-
-        # Covers RASN and SHRASN
-        if 'SN' in sig_wx:
-            threshs, new_viss = [9000, 4500, 2500], [8000, 4000, 2000]
-
-        # Covers all other rain codes
-        else:
-            threshs, new_viss = [9999, 8000, 4000], [9000, 7000, 3000]
-
-    # Covers SN and SHSN
-    elif 'SN' in sig_wx:
-        threshs, new_viss = [6000, 2000, 800], [4000, 1500, 800]
-
-    # Covers SHGS (not sure of good max value here) and DZ
-    elif any(ele in sig_wx for ele in ['GS', 'DZ']):
-        threshs, new_viss = [8000, 5000, 1500], [7000, 4000, 1500]
+    # Get visibility limit for sig wx code
+    vis_limit = sig_wx_vis_limit(sig_wx)
 
     # Update visibility if necessary
-    for test_rate, thresh, new_vis in zip(test_rates, threshs, new_viss):
-        if rate == test_rate and vis >= thresh:
-            vis = new_vis
-            break
+    if vis_limit is not None and vis >= vis_limit[0]:
+        vis = vis_limit[1]
 
     return vis
 
@@ -314,6 +291,33 @@ def cld_change(old_cat, new_cat, rules):
     return change
 
 
+def cld_change_col(old_cats, new_cats, rules):
+    """
+    Checks for significant cloud changes, as in cld_change, for arrays
+    of cloud categories.
+
+    Args:
+        old_cats (numpy.ndarray): Old cloud categories
+        new_cats (numpy.ndarray): New cloud categories
+        rules (numpy.ndarray): TAF rules for airport
+    Returns:
+        changes (numpy.ndarray): Indications of significant changes
+    """
+    old_cats = np.asarray(old_cats, dtype=float)
+    new_cats = np.asarray(new_cats, dtype=float)
+
+    # Simple category differences for defence and lower categories
+    simple = ((np.asarray(rules) == 'defence') | (old_cats <= 4.)
+              | (new_cats <= 4.))
+
+    # Otherwise, account for CAVOK rules
+    cavok_changes = np.select([(old_cats == 5) & (new_cats == 7),
+                               (old_cats == 7) & (new_cats == 5)], [1, -1], 0)
+    changes = np.where(simple, np.trunc(new_cats - old_cats), cavok_changes)
+
+    return changes.astype(int)
+
+
 def dir_change(wind_dirs, wind_means, rules):
     """
     Determines if an difference in wind direction is a significant
@@ -350,6 +354,38 @@ def dir_change(wind_dirs, wind_means, rules):
     return sig_diff
 
 
+def dir_change_col(wind_dirs, wind_means, rules):
+    """
+    Determines if differences in wind direction are significant, as in
+    dir_change, for arrays of wind directions and means.
+
+    Args:
+        wind_dirs (tuple): Arrays of wind directions
+        wind_means (tuple): Arrays of wind means
+        rules (numpy.ndarray): TAF rules for airport
+    Returns:
+        sig_diffs (numpy.ndarray): Indications for whether differences
+                                   significant
+    """
+    # Get smallest modular difference in wind directions in degrees
+    abs_diffs = np.abs(np.asarray(wind_dirs[0], dtype=float)
+                       - np.asarray(wind_dirs[1], dtype=float))
+    diffs = np.where(abs_diffs <= 180, abs_diffs, np.mod(-abs_diffs, 360))
+
+    # Significance depends on largest wind mean
+    max_means = np.maximum(np.asarray(wind_means[0], dtype=float),
+                           np.asarray(wind_means[1], dtype=float))
+
+    # Limits for defence, diffs between 30 and 60 degrees and diffs of
+    # at least 60 degrees (diffs less than 30 degrees never significant)
+    sig_diffs = np.select(
+        [diffs < 30, np.asarray(rules) == 'defence', diffs < 60],
+        [False, max_means >= 15, max_means >= 20], max_means >= 10
+    )
+
+    return sig_diffs
+
+
 def gust_change(old_gust, new_gust, old_mean, new_mean, becmg=False):
     """
     Checks for significant gust changes (increase or decrease).
@@ -409,6 +445,48 @@ def gust_change(old_gust, new_gust, old_mean, new_mean, becmg=False):
     return change
 
 
+def gust_change_col(old_gusts, new_gusts, old_means, new_means,
+                    becmg=False):
+    """
+    Checks for significant gust changes, as in gust_change, for arrays
+    of gusts and means.
+
+    Args:
+        old_gusts (numpy.ndarray): Old gusts
+        new_gusts (numpy.ndarray): New gusts
+        old_means (numpy.ndarray): Old mean speeds
+        new_means (numpy.ndarray): New mean speeds
+        becmg (bool): Indication of whether being used for BECMG group
+    Returns:
+        changes (numpy.ndarray): Types of significant change
+    """
+    old_gusts = np.asarray(old_gusts, dtype=float)
+    new_gusts = np.asarray(new_gusts, dtype=float)
+    old_means = np.asarray(old_means, dtype=float)
+    new_means = np.asarray(new_means, dtype=float)
+
+    # Increases in gust strength (BECMG groups also need mean >=15kt)
+    increases = ((new_gusts >= 25) & (new_gusts >= old_gusts + 10)
+                 & (new_gusts >= old_means + 13))
+    inc_changes = np.trunc((new_gusts - np.maximum(old_gusts, 15)) / 10)
+    if becmg:
+        inc_changes = np.where(new_means < 15, 0, inc_changes)
+
+    # Decreases in gust strength, when gusts reported in old wind group
+    decreases = (old_gusts >= 25) & (old_gusts >= old_means + 10)
+    unreported = np.minimum(-1, np.trunc((new_means - old_gusts) / 10))
+    dec_changes = np.select(
+        [new_means < 10, new_gusts < new_means + 10,
+         new_gusts <= old_gusts - 10],
+        [unreported, unreported, np.trunc((new_gusts - old_gusts) / 10)], 0
+    )
+
+    # Otherwise, change is not significant
+    changes = np.select([increases, decreases], [inc_changes, dec_changes], 0)
+
+    return changes.astype(int)
+
+
 def mean_change(mean_1, mean_2, rules):
     """
     Determines if mean_2 is a significant change from mean_1.
@@ -432,6 +510,80 @@ def mean_change(mean_1, mean_2, rules):
     return change
 
 
+def mean_change_col(means_1, means_2, rules):
+    """
+    Determines if wind means are significant changes, as in mean_change,
+    for arrays of wind means.
+
+    Args:
+        means_1 (numpy.ndarray): First mean wind values
+        means_2 (numpy.ndarray): Second mean wind values
+        rules (numpy.ndarray): Airport TAF rules
+    Returns:
+        changes (numpy.ndarray): Indications for whether mean speeds are
+                                 significantly different
+    """
+    means_1 = np.asarray(means_1, dtype=float)
+    means_2 = np.asarray(means_2, dtype=float)
+
+    # Difference of more than 10kt, with extra condition for defence
+    # that mean should be >=15kts before or after
+    changes = ((np.abs(means_2 - means_1) >= 10)
+               & ((np.asarray(rules) != 'defence')
+                  | (np.maximum(means_1, means_2) >= 15)))
+
+    return changes
+
+
+def sig_wx_vis_limit(sig_wx):
+    """
+    Determines the highest visibility sensible for sig wx code, along
+    with the visibility to use instead if this is exceeded.
+
+    Args:
+        sig_wx (str): Significant weather code
+    Return:
+        vis_limit (tuple): Visibility threshold and new visibility (None
+                           if no limit for sig wx code)
+    """
+    # No limit for non-precip codes
+    if sig_wx in co.NON_PRECIP_CODES:
+        return None
+
+    # Determine precip rate
+    rate = ca.get_rate(sig_wx)
+
+    # Define rates used
+    test_rates = ['light', 'moderate', 'heavy']
+
+    # Covers all codes including rain
+    if 'RA' in sig_wx:
+
+        # Covers RASN and SHRASN
+        if 'SN' in sig_wx:
+            threshs, new_viss = [9000, 4500, 2500], [8000, 4000, 2000]
+
+        # Covers all other rain codes
+        else:
+            threshs, new_viss = [9999, 8000, 4000], [9000, 7000, 3000]
+
+    # Covers SN and SHSN
+    elif 'SN' in sig_wx:
+        threshs, new_viss = [6000, 2000, 800], [4000, 1500, 800]
+
+    # Covers SHGS (not sure of good max value here) and DZ
+    elif any(ele in sig_wx for ele in ['GS', 'DZ']):
+        threshs, new_viss = [8000, 5000, 1500], [7000, 4000, 1500]
+
+    # Get limit for precip rate
+    for test_rate, thresh, new_vis in zip(test_rates, threshs, new_viss):
+        if rate == test_rate:
+            vis_limit = (thresh, new_vis)
+            break
+
+    return vis_limit
+
+
 def vis_based_wx(vis, temp, rules, sig_wx):
     """
     Adjusts wx codes based on visibility.
@@ -519,3 +671,20 @@ def vis_change(old_cat, new_cat):
     change = int(new_cat) - int(old_cat)
 
     return change
+
+
+def vis_change_col(old_cats, new_cats):
+    """
+    Checks for significant visibility changes, as in vis_change, for
+    arrays of visibility categories.
+
+    Args:
+        old_cats (numpy.ndarray): Old visibility categories
+        new_cats (numpy.ndarray): New visibility categories
+    Returns:
+        changes (numpy.ndarray): Indications of significant changes
+    """
+    changes = (np.trunc(np.asarray(new_cats, dtype=float))
+               - np.trunc(np.asarray(old_cats, dtype=float)))
+
+    return changes.astype(int)
@@ -86,6 +86,14 @@ PRECIP_CODES = ['+SHSN', '+SN', '+SHRASN', '+RASN', '+TSRA', '+SHGS', '+SHRA',
                 'SHRA', 'RA', 'DZ', '-SHSN', '-SN', '-SHRASN', '-RASN',
                 '-TSRA', '-SHGS', '-SHRA', '-RA', '-DZ']
 TS_CODES = ['+TSRA', 'TSRA', '-TSRA']
+
+# Visibility limits for wind mean limits, used when cloud base below
+# each cloud base limit (last vis used for stronger winds)
+VIS_CLD_WIND_RULES = {
+    100: {'wind': [3, 6, 10, 15], 'vis': [300, 800, 1400, 3000, 5000]},
+    200: {'wind': [5, 10, 15], 'vis': [1200, 3000, 5000, 9000]},
+    400: {'wind': [5, 10], 'vis': [5000, 9000, 9999]}
+}
 HVY_CODES = ['+SHSN', '+SN', '+SHRASN', '+RASN', '+SHGS', '+SHRA', '+RA']
 
 # Ordering priority of change groups
@@ -95,6 +103,16 @@ PRIORITY_DICT = {'base': 0, 'BECMG': 1, 'TEMPO': 2, 'PROB40': 3,
 PROB_DICT = {'TEMPO': 100, 'PROB40': 40, 'PROB40 TEMPO': 40, 'PROB30': 30,
              'PROB30 TEMPO': 30}
 
+# Columns of TEMPO/PROB change arrays (50th percentile split into
+# decreasing and increasing changes)
+CHANGE_COLS = ['30', '40', '60', '70', '50d', '50i']
+
+# Maximum number of BECMG group options kept at each step of search
+BECMG_BEAM_WIDTH = 30
+
+# Base condition keys not affecting later BECMG groups
+BECMG_INFO_KEYS = ['change_type', 'change_period', 'wx_changes']
+
 # ML constants
 PARAM_COLS = [
     'precip_rate_30.0', 'precip_rate_50.0', 'precip_rate_70.0', 
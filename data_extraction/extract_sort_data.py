@@ -2,41 +2,64 @@
 Extracts and sorts data ready for TAF generation.
 
 Functions:
+    apply_by_key: Applies row function once per unique key combination.
+    cld_cat_col: Determines cloud TAF categories for all rows.
     cld_cat_row: Determines cloud TAF category based on cloud values.
     day_season: Determines day type and season at start of TAF period.
     estimate_precip: Estimates precip code based on other parameters.
     estimate_sig_wx: Estimates sig wx code.
+    estimate_sig_wx_col: Estimates sig wx codes for all rows.
     extract_data: Extracts relevant data from MASS.
     fill_in_sig_wxs: Fills in missing sig wx values.
+    find_spot_file: Finds latest blend file for a parameter and time.
+    get_all_site_data: Gets airport-specific data for all airports.
     get_imp_data: Collects required IMPROVER data from files.
     get_open_taf_hours: Gets valid TAF datetimes based on airport hours.
-    get_site_data: Filters IMPROVER data to get airport-specific data.
+    get_param_fnames: Determines files needed for each parameter.
+    get_perc_50_values: Gets 50th percentile values for each row.
+    get_spot_tar: Copies spot tar file from MASS.
     get_start_end_dts: Finds start and end times for subsetting data.
     get_taf_hrs: Gets all possible TAF hours based on longest TAF.
+    index_tar_listing: Indexes IMPROVER spot files listed in tar file.
+    load_filter_arrays: Loads IMPROVER data for a parameter as arrays.
     load_filter_data: Loads in IMPROVER data for a weather parameter.
+    open_spot_file: Opens spot file from filesystem or tar file.
+    open_tar_mmaps: Memory-maps tar files for the duration of a load.
+    read_spot_file: Reads site and percentile slices from spot file.
+    round_cld_col: Rounds cloud bases appropriately.
     round_dir: Rounds wind direction to nearest 10 degrees.
+    round_dir_col: Rounds wind directions to nearest 10 degrees.
+    round_vis_col: Rounds vis appropriately for all rows.
     round_vis_row: Rounds vis appropriately on row of dataframe.
+    stream_data: Indexes relevant data in tar file from MASS.
     update_sig_wx: Converts sig wx codes to TAF-specific strings.
+    update_sig_wx_col: Converts sig wx codes for all rows.
     update_sig_wx_for_new_vis: Updates sig wx code based on new vis.
     update_values: Updates IMPROVER values.
     update_vis: Checks visibility lines up with cloud, wind and sig wx.
+    update_vis_col: Checks visibilities for all rows.
+    vis_cat_col: Determines visibility TAF categories for all rows.
     vis_cat_row: Determines visibility TAF category based on vis value.
 """
+import contextlib
 import glob
 import math
+import mmap
 import os
-import queue as queue_module
 import re
 import subprocess
 import sys
-import time
+import tarfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from datetime import datetime, timedelta
-from multiprocessing import Process, Queue
 from zoneinfo import ZoneInfo
 
 import holidays
 import iris
+import netCDF4
+import numpy as np
 import pandas as pd
+from cf_units import Unit
 from dateutil.rrule import HOURLY, rrule
 from iris.pandas import as_data_frame
 from iris.util import equalise_attributes, promote_aux_coord_to_dim_coord
@@ -44,17 +67,119 @@ from iris.util import equalise_attributes, promote_aux_coord_to_dim_coord
 import common.calculations as ca
 import common.checks as ch
 import common.configs as co
+import data_extraction.param_cache as pc
 
 # Define environment constants
 DATA_DIR = os.environ['DATA_DIR']
 MASS_DIR = os.environ['MASS_DIR']
 AIRPORT_INFO_FILE = os.environ['AIRPORT_INFO_FILE']
 
+# Loader used for IMPROVER files ('arrays' reads NetCDF slices directly,
+# 'iris' uses the original cube-based loader)
+IMP_LOADER = os.environ.get('IMP_LOADER', 'arrays')
+
+# Number of processes used to load parameters (0 to size to host)
+LOAD_WORKERS = int(os.environ.get('LOAD_WORKERS', 0))
+
+# How spot files are read from tar file ('stream' reads them straight
+# from the tar file, 'extract' untars them to DATA_DIR first) - the iris
+# loader always needs extracted files
+SPOT_MODE = os.environ.get('SPOT_MODE', 'stream')
+
+# Blend minutes to look for in IMPROVER file names, latest first
+BLEND_MINUTES = ['45', '30', '15', '00']
+
+# Pattern for IMPROVER spot file names, e.g.
+# spotperc_extract_20250210T0300Z-B20250209T2145Z-wind_speed_at_10m.nc
+SPOT_FNAME_RE = re.compile(
+    r'(?P<prefix>[^/]*?)(?P<vt>\d{8}T\d{4}Z)-B(?P<blend>\d{8}T\d{2})'
+    r'(?P<minute>\d{2})Z-(?P<param>.+)\.nc'
+)
+
 # To stop pandas warnings
 iris.FUTURE.pandas_ndim = True
 pd.options.mode.chained_assignment = None
 
 
+def apply_by_key(row_func, site_df, keys):
+    """
+    Applies function to each row of dataframe, as with
+    site_df.apply(row_func, axis=1), but only calls function once for
+    each unique combination of keys. Keys must capture everything that
+    the output of the function depends on.
+
+    Args:
+        row_func (function): Function applied to rows of dataframe (as
+                             dictionaries)
+        site_df (pandas.DataFrame): Dataframe containing IMPROVER and
+                                    airport data
+        keys (list): Arrays of key values, one value for each row
+    Return:
+        outputs (numpy.ndarray): Function output for each row
+    """
+    # Label rows by their combination of keys (in order of appearance)
+    key_df = pd.DataFrame({ind: np.asarray(key)
+                           for ind, key in enumerate(keys)})
+    codes = key_df.groupby(list(key_df.columns), sort=False,
+                           dropna=False).ngroup().to_numpy()
+
+    # Apply function to first row with each combination of keys (rows
+    # as dictionaries, which are much quicker to create than series)
+    _, first_inds = np.unique(codes, return_index=True)
+    rows = site_df.iloc[first_inds].to_dict('records')
+    outputs = np.empty(len(rows), dtype=object)
+    for code, row in enumerate(rows):
+        outputs[code] = row_func(row)
+
+    return outputs[codes]
+
+
+def cld_cat_col(site_df):
+    """
+    Determines cloud base TAF categories for all rows of dataframe.
+    Vectorised version of cld_cat_row.
+
+    Args:
+        site_df (pandas.DataFrame): Dataframe containing IMPROVER and
+                                    airport data
+    Return:
+        cld_cats (numpy.ndarray): Cloud base categories
+    """
+    # Get cloud values and TAF rules
+    cld_3 = site_df['cld_3'].to_numpy(dtype=float)
+    cld_5 = site_df['cld_5'].to_numpy(dtype=float)
+    rules = site_df['rules_col'].to_numpy()
+
+    # For defence TAFs, both cloud amounts are always considered
+    clds = np.minimum(cld_3, cld_5)
+    thresholds = [2500, 1500, 700, 500, 300, 200, 0]
+    categories = [7., 6., 5., 4., 3., 2., 1.]
+    def_cats = np.select([clds >= thresh for thresh in thresholds],
+                         categories, np.nan)
+
+    # For civil TAFs, mainly only 5 okta cloud considered, but 3 okta
+    # cloud considered for CAVOK conditions
+    high_cat = np.where(cld_3 >= 5000, 7., 6.)
+
+    # Offshore thresholds/categories
+    thresholds = [5000, 1500, 1000, 700, 500, 200, 0]
+    categories = [high_cat, 5., 4., 3., 2., 1., 0.]
+    off_cats = np.select([cld_5 >= thresh for thresh in thresholds],
+                         categories, np.nan)
+
+    # Main civil thresholds/categories
+    thresholds = [5000, 1500, 1000, 500, 200, 0]
+    categories = [high_cat, 5., 4., 3., 2., 1.]
+    civ_cats = np.select([cld_5 >= thresh for thresh in thresholds],
+                         categories, np.nan)
+
+    # Choose categories based on TAF rules
+    cld_cats = np.select([rules == 'defence', rules == 'offshore'],
+                         [def_cats, off_cats], civ_cats)
+
+    return cld_cats
+
+
 def cld_cat_row(row):
     """
     Determines cloud base TAF category based on info in row of
@@ -114,9 +239,8 @@ def estimate_precip(row):
     Return:
         wx_str (str): Sig wx code
     """
-    # 50th percentile sig wx and temp are currently code currently
-    # assigned to sig_wx
-    sig_wx_50, temp_50 = row['sig_wx']
+    # 50th percentile sig wx and temp at same time
+    sig_wx_50, temp_50 = row['sig_wx_50'], row['temp_50']
 
     # If precip in 50th percentile sig wx, assume same type here
     if 'TS' in sig_wx_50:
@@ -160,7 +284,8 @@ def estimate_sig_wx(row):
     so codes are estimated here based on other IMPROVER parameters.
 
     Args:
-        row (pandas.Series): Row of dataframe
+        row (pandas.Series): Row of dataframe, including 50th percentile
+                             sig wx and temp at the same time
     Return:
         wx_str (str): Sig wx code
     """
@@ -185,70 +310,72 @@ def estimate_sig_wx(row):
     return wx_str
 
 
+def estimate_sig_wx_col(site_df):
+    """
+    Estimates sig wx codes for all rows of dataframe. Estimated codes
+    only depend on the 50th percentile sig wx code, TAF rules and which
+    side of the thresholds used in estimate_precip, checks.check_rate
+    and checks.check_mist_fog precip rate, visibility and temperature
+    lie, so estimate_sig_wx is only applied once for each combination of
+    these.
+
+    Args:
+        site_df (pandas.DataFrame): Dataframe containing IMPROVER and
+                                    airport data, including 50th
+                                    percentile sig wx and temp
+    Return:
+        wx_strs (numpy.ndarray): Sig wx codes
+    """
+    # Leave 50th percentiles unchanged
+    wx_strs = site_df['sig_wx'].to_numpy(dtype=object).copy()
+    est_rows = (site_df['percentile'] != 50).to_numpy()
+    if not est_rows.any():
+        return wx_strs
+    est_df = site_df[est_rows]
+
+    precip_rate = est_df['precip_rate'].to_numpy(dtype=float)
+    vis = est_df['vis'].to_numpy(dtype=float)
+    temp = est_df['temp'].to_numpy(dtype=float)
+    temp_50 = est_df['temp_50'].to_numpy(dtype=float)
+
+    # Define keys from 50th percentile sig wx code, rules and thresholds
+    keys = [est_df['sig_wx_50'], est_df['rules_col'], temp < 0,
+            temp <= temp_50, precip_rate > 0.1, precip_rate <= 0.1]
+    keys += [precip_rate < limit for limit in [0.5, 2, 4, 10]]
+    keys += [vis < limit for limit in [1000, 9999]]
+    keys += [vis >= limit for limit in [1000, 5000, 9999]]
+    keys += [vis <= 5000, vis == 5000, vis > 5000]
+
+    # Estimate sig wx codes
+    wx_strs[est_rows] = apply_by_key(estimate_sig_wx, est_df, keys)
+
+    return wx_strs
+
+
 def extract_data(blend_str):
     """
     Extracts relevant data from MASS.
 
      Args:
         blend_str (str): String containing blend date.
+    Returns:
+        param_fnames (dict): Start of file names for each parameter
+        spot_index (dict): Extracted file paths keyed by file name start,
+                           parameter, validity time and blend minute
     """
-    # Extract tar file from MASS
-    moo_cmd = subprocess.run(
-        ['moo', 'get', f'{MASS_DIR}/mix_suite_{blend_str}00Z/spot.tar',
-         f'{DATA_DIR}/{blend_str}00Z_spot.tar'],
-         check=False, capture_output=True, encoding="utf-8"
-    )
-
-    # Exit if file not on MASS
-    if moo_cmd.returncode not in [0]:
-        print('Return code', moo_cmd.returncode)
-        raise FileNotFoundError("archive not found on mass")
+    # Get tar file from MASS
+    tar_file = get_spot_tar(blend_str)
 
     # Get list of filenames from tar file
     list_files_cmd = subprocess.run(
-        ['tar', '-tf', f'{DATA_DIR}/{blend_str}00Z_spot.tar'], check=True,
+        ['tar', '-tf', tar_file], check=True,
          capture_output=True, encoding="utf-8")
     fnames_in_tar = list_files_cmd.stdout.splitlines()
 
-    # Get list of filenames in tar file needed for TAF generation
-    fnames_to_extract = []
-
-    # Loop through required parameters and determine filenames
-    param_fnames = {}
-    for param, param_configs in co.IMPROVER_PARAMETERS.items():
-
-        # Define start of filename to extract data from
-        fname_start = param_configs['fname_start']
-        alt_fname_start = param_configs['fname_start_alt']
-        fname_pattern = f"spot/{fname_start}.*B.*Z-{param}.nc"
-        alt_fname_pattern = f"spot/{alt_fname_start}.*B.*Z-{param}.nc"
-
-        # List to add filenames to
-        param_fnames_arch = []
-
-        # Find all files in tar that match filename pattern
-        for file in fnames_in_tar:
-            matches = re.findall(fname_pattern, file)
-            if matches:
-                param_fnames_arch.extend(matches)
-
-        # Use alternative filename pattern if no matches
-        if not param_fnames_arch:
-            param_fnames[param] = alt_fname_start
-            for file in fnames_in_tar:
-                matches = re.findall(alt_fname_pattern, file)
-                if matches:
-                    param_fnames_arch.extend(matches)
-        else:
-            param_fnames[param] = fname_start
-
-        # if no matching files than raise error
-        if not param_fnames_arch:
-            raise FileNotFoundError(f'No files for {param} found in tar '
-                                    'archive')
-
-        # Add to list of required files
-        fnames_to_extract.extend(param_fnames_arch)
+    # Index files in tar file, then get files needed for TAF generation
+    tar_index = index_tar_listing(fnames_in_tar, blend_str)
+    param_fnames, spot_keys = get_param_fnames(tar_index)
+    fnames_to_extract = [tar_index[key] for key in spot_keys]
 
     # Make directory to put files in
     dest = f'{DATA_DIR}/{blend_str}00Z'
@@ -262,7 +389,7 @@ def extract_data(blend_str):
 
     # Untar all files
     tar_cmd = subprocess.run(
-        ['tar', '-xC', dest, '-f', f'{DATA_DIR}/{blend_str}00Z_spot.tar',
+        ['tar', '-xC', dest, '-f', tar_file,
          f'--files-from={fetch_files_file}',
          '--strip-components=1'],
          check=False, capture_output=True, encoding="utf-8"
@@ -273,7 +400,11 @@ def extract_data(blend_str):
         print(f'/nTAR ERRORS\n{tar_cmd.stderr}/nTAR OUTPUT\n{tar_cmd.stdout}')
     tar_cmd.check_returncode()
 
-    return param_fnames
+    # Paths of extracted files (leading directory is stripped)
+    spot_index = {key: f'{dest}/{os.path.basename(tar_index[key])}'
+                  for key in spot_keys}
+
+    return param_fnames, spot_index
 
 
 def fill_in_sig_wxs(site_df):
@@ -286,22 +417,122 @@ def fill_in_sig_wxs(site_df):
     Return:
         site_df (str): Updated dataframe
     """
-    # First, set non-50th percentile sig wxs to contain 50th percentile
-    # sig wxs and temps
-    # (There's probably a better way to do this)
-    for ind, row in site_df.iterrows():
-        if not isinstance(row['sig_wx'], str):
-            row_50 = site_df[(site_df['time'] == row['time']) &
-                             (site_df['percentile'] == 50)]
-            site_df.at[ind, 'sig_wx'] = [row_50['sig_wx'].values[0],
-                                         row_50['temp'].values[0]]
+    # Get 50th percentile sig wx and temp at same time as each row
+    values_50 = get_perc_50_values(site_df, ['sig_wx', 'temp'])
+    est_df = site_df.assign(sig_wx_50=values_50['sig_wx'],
+                            temp_50=values_50['temp'])
 
-    # Now update these values using other weather elements in each row
-    site_df['sig_wx'] = site_df.apply(estimate_sig_wx, axis=1)
+    # Now estimate sig wxs using other weather elements in each row
+    site_df['sig_wx'] = estimate_sig_wx_col(est_df)
 
     return site_df
 
 
+def find_spot_file(spot_index, fname, param, tdt_str):
+    """
+    Finds the latest blend file available for a weather parameter at a
+    validity time.
+
+    Args:
+        spot_index (dict): Spot file locations keyed by file name start,
+                           parameter, validity time and blend minute
+        fname (str): String with start of fname
+        param (str): Weather parameter used for IMPROVER file name
+        tdt_str (str): Validity time string
+    Returns:
+        location (str): Location of file (None if not found)
+    """
+    # Get latest blend time possible
+    for minutes in BLEND_MINUTES:
+        location = spot_index.get((fname, param, tdt_str, minutes))
+        if location is not None:
+            return location
+
+    return None
+
+
+def get_all_site_data(param_dfs_missing_times, airport_info, taf_dts):
+    """
+    Filters IMPROVER data to obtain data relevant to all airports at
+    once. Parameter dataframes are merged once for all sites, subset
+    using each airport's opening hours and updated together before being
+    split up by airport.
+
+    Args:
+        param_dfs_missing_times (tuple): Dataframes containing IMPROVER
+                                         data and missing times
+        airport_info (pandas.DataFrame): Airport information
+        taf_dts (list): Datetimes relevant to TAF period
+    Returns:
+        site_dfs (dict): Dataframes containing IMPROVER and airport data,
+                         keyed by airport_info index (airports without
+                         data are left out)
+    """
+    # All times missing from any parameter
+    missing_times = {m_time for _, param_missing_times
+                     in param_dfs_missing_times
+                     for m_time in param_missing_times}
+
+    # Get TAF datetimes for each airport based on opening hours
+    windows = []
+    for ind, site_info in airport_info.iterrows():
+        site_dts = get_open_taf_hours(site_info, taf_dts)
+
+        # Ignore airport if no valid TAF datetimes or any missing data
+        if not site_dts or any(m_time in site_dts for m_time in missing_times):
+            continue
+
+        # Collect TAF datetimes, TAF times and rules for airport
+        windows.append(pd.DataFrame({
+            'site': site_info['site_number'],
+            'time': pd.Series(list(site_dts), dtype=object),
+            'airport_ind': ind,
+            'taf_time': list(site_dts.values()),
+            'rules_col': site_info['rules']
+        }))
+
+    # Return empty dictionary if no airports to get data for
+    if not windows:
+        return {}
+
+    # Merge all parameter dataframes into single dataframe
+    for num, (param_df, _) in enumerate(param_dfs_missing_times):
+        if num == 0:
+            all_df = param_df
+        else:
+            all_df = all_df.merge(param_df, how='outer',
+                                  on=['site', 'time', 'percentile'])
+
+    # Subset data using opening hours of airports, adding time and rules
+    # info to dataframe
+    all_df = all_df.merge(pd.concat(windows, ignore_index=True),
+                          how='inner', on=['site', 'time'])
+
+    # Abandon if dataframe is empty
+    if all_df.empty:
+        return {}
+
+    # Don't need site column anymore (airport index used instead)
+    all_df = all_df.drop(columns=['site'])
+    all_df = all_df.sort_values(['airport_ind', 'time', 'percentile'],
+                                kind='stable').reset_index(drop=True)
+
+    # Update values - e.g. ensure correct units, round values if
+    # necessary and ensure internal consistency between visibility,
+    # cloud and sig wx
+    all_df = update_values(all_df)
+
+    # Split up by airport, adding required airport info as attributes
+    vrbs = ['rules', 'airport_name', 'icao', 'taf_issue', 'taf_start', 'bench']
+    site_dfs = {}
+    for ind, site_df in all_df.groupby('airport_ind', sort=False):
+        site_df = site_df.drop(columns=['airport_ind']).reset_index(drop=True)
+        site_df.attrs = {vrb: airport_info.loc[ind, vrb] for vrb in vrbs}
+        site_dfs[ind] = site_df
+
+    return site_dfs
+
+
 def get_imp_data(taf_start):
     """
     Collects required IMPROVER data from files.
@@ -332,72 +563,89 @@ def get_imp_data(taf_start):
     sites_con = iris.Constraint(met_office_site_id=sites)
     perc_con = iris.Constraint(percentile=co.PERCENTILES)
 
-    # Extract data from MASS, collecting fnames for each parameter
-    param_fnames = extract_data(blend_str)
-
-    # Define variables for multiprocessing
-    queue = Queue()
-    processes = []
-
-    # Get required IMPROVER data from extracted files
-    for param, fname in param_fnames.items():
-
-        # Define arguments for multiprocessing
-        args = (load_filter_data,
-                [param, sites_con, perc_con, taf_dts, fname, blend_str],
-                queue)
-
-        # Append process for multiprocessing
-        processes.append(Process(target=ca.mp_queue, args=args))
-
-    # Start processes
-    for process in processes:
-        process.start()
-
-    # Collect output from processes and check for errors
-    param_dfs_missing_times = []
-    error_occurred = False
-
-    # Use a loop with timeout to periodically check for queue messages
-    while processes:
-        try:
-            # Try to get the result from the queue without blocking
-            result = queue.get_nowait()
-
-            if result == co.ERROR_SENTINEL:
-                error_occurred = True
-                break
-            param_dfs_missing_times.append(result)
-
-        except queue_module.Empty:
-            # No messages yet, wait a bit and continue checking
-            time.sleep(0.1)
-
-        # Check if any process has finished
-        for process in processes.copy():
-            if not process.is_alive():
-                processes.remove(process)
-
-    # If an error occurred, terminate all running processes
-    if error_occurred:
-        print('An error occurred in one of the loading data processes. '
-              'Terminating all processes.', file=sys.stderr)
-        for process in processes:
-            if process.is_alive():
-                process.terminate()
-                process.join()  # Ensure the process is terminated
-        queue.close()
-        sys.exit(1)  # Exit with a non-zero status indicating an error
+    # Get any parameter data already in cache (loading data as normal if
+    # cache can not be read)
+    cached = {}
+    if pc.CACHE_DIR:
+        for param in co.IMPROVER_PARAMETERS:
+            try:
+                result = pc.read_param(blend_str, param, co.PERCENTILES,
+                                       sites)
+            except Exception as error:
+                print(f'Error reading {param} data from cache: {error}',
+                      file=sys.stderr)
+                continue
+            if result is not None:
+                cached[param] = result
+
+    # No need to go to MASS if all parameters found in cache
+    if len(cached) == len(co.IMPROVER_PARAMETERS):
+        param_dfs_missing_times = [cached[param]
+                                   for param in co.IMPROVER_PARAMETERS]
+        return param_dfs_missing_times, airport_info, taf_dts
+
+    # Get data from MASS, collecting fnames for each parameter and
+    # indexing files once so loaders do not probe the filesystem
+    if IMP_LOADER == 'iris' or SPOT_MODE == 'extract':
+        param_fnames, spot_index = extract_data(blend_str)
     else:
-        # Wait for all remaining processes to complete normally
-        for process in processes:
-            process.join()
-
-    queue.close()
+        param_fnames, spot_index = stream_data(blend_str)
+
+    # Get required IMPROVER data not found in cache
+    to_load = {param: fname for param, fname in param_fnames.items()
+               if param not in cached}
+
+    # Load parameters in pool of processes, sized to host if number of
+    # workers not specified
+    max_workers = LOAD_WORKERS or min(len(to_load), os.cpu_count())
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+
+        # Submit a timed loading task for each parameter
+        futures = {}
+        for param, fname in to_load.items():
+            if IMP_LOADER == 'iris':
+                args = [param, sites_con, perc_con, taf_dts, fname,
+                        spot_index]
+                future = executor.submit(ca.timed_call, load_filter_data,
+                                         args)
+            else:
+                args = [param, sites, taf_dts, fname, spot_index]
+                future = executor.submit(ca.timed_call, load_filter_arrays,
+                                         args)
+            futures[future] = param
+
+        # Collect output as tasks finish, cancelling outstanding tasks
+        # and re-raising if any task fails
+        for future in as_completed(futures):
+            param = futures[future]
+            try:
+                (param_df, missing_times), elapsed = future.result()
+            except Exception:
+                print(f'Error loading {param} data, cancelling remaining '
+                      'tasks.', file=sys.stderr)
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise
+            print(f'Loaded {param} data in {elapsed:.1f}s')
+            cached[param] = (param_df, missing_times)
+
+            # Add to cache for future runs (unless any files were missing,
+            # as they may be archived by the time of the next run),
+            # carrying on without caching if cache can not be written
+            if pc.CACHE_DIR and not missing_times:
+                try:
+                    pc.write_param(blend_str, param, co.PERCENTILES, sites,
+                                   param_df, missing_times)
+                except Exception as error:
+                    print(f'Error writing {param} data to cache: {error}',
+                          file=sys.stderr)
 
     # Remove blend time data files
     os.system(f'rm -r {DATA_DIR}/{blend_str}*')
 
+    # Collect data in consistent parameter order
+    param_dfs_missing_times = [cached[param]
+                               for param in co.IMPROVER_PARAMETERS]
+
     return param_dfs_missing_times, airport_info, taf_dts
 
 
@@ -469,70 +717,94 @@ def get_open_taf_hours(site_info, taf_dts):
     return site_dts
 
 
-def get_site_data(param_dfs_missing_times, site_info, taf_dts):
+def get_param_fnames(tar_index):
     """
-    Filters IMPROVER data to obtain data relevant to airport.
+    Determines which files in the tar archive are needed for each
+    weather parameter.
 
     Args:
-        param_dfs_missing_times (tuple): Dataframes containing IMPROVER
-                                         data and missing times
-        site_info (pandas.Series): Series containing airport info
-        taf_dts (list): Datetimes relevant to TAF period
+        tar_index (dict): Names of files in tar archive keyed by file
+                          name start, parameter, validity time and blend
+                          minute
     Returns:
-        site_df (pandas.DataFrame): Dataframe containing IMPROVER and
-                                    airport data
+        param_fnames (dict): Start of file names for each parameter
+        spot_keys (list): Index keys of required files in archive
     """
-    # Get TAF datetimes based on airport opening hours
-    site_dts = get_open_taf_hours(site_info, taf_dts)
+    # File name starts and parameters available in tar file
+    available = {key[:2] for key in tar_index}
 
-    # Return empty dataframe valid TAF datetimes found
-    if not site_dts:
-        return pd.DataFrame()
+    # Loop through required parameters and determine filenames
+    param_fnames = {}
+    for param, param_configs in co.IMPROVER_PARAMETERS.items():
 
-    # Loop through all parameter dataframes, take out revevant data and
-    # merge into single dataframe
-    for ind, (param_df, missing_times) in enumerate(param_dfs_missing_times):
+        # Use alternative start of filename if no matches
+        if (param_configs['fname_start'], param) in available:
+            param_fnames[param] = param_configs['fname_start']
+        elif (param_configs['fname_start_alt'], param) in available:
+            param_fnames[param] = param_configs['fname_start_alt']
 
-        # Check for any missing data
-        if any(m_time in site_dts for m_time in missing_times):
-            return pd.DataFrame()
+        # if no matching files than raise error
+        else:
+            raise FileNotFoundError(f'No files for {param} found in tar '
+                                    'archive')
 
-        # Subset data using opening hours of airport and site number
-        param_df = param_df[param_df['time'].isin(site_dts)]
-        param_df = param_df[param_df['site'] == site_info['site_number']]
+    # Get list of files in tar file needed for TAF generation
+    required = {(fname, param) for param, fname in param_fnames.items()}
+    spot_keys = [key for key in tar_index if key[:2] in required]
 
-        # Don't need site column anymore
-        param_df.drop(['site'], axis=1, inplace=True)
+    return param_fnames, spot_keys
 
-        # For first iteration, set site dataframe to parameter dataframe
-        if ind == 0:
-            site_df = param_df
 
-        # Otherwise merge parameter dataframe with site dataframe
-        else:
-            site_df = site_df.merge(param_df, how='outer',
-                                    on=['time', 'percentile'])
+def get_perc_50_values(site_df, cols):
+    """
+    Gets 50th percentile values at the same time and airport as each
+    row of dataframe.
 
-    # Abandon if dataframe is empty
-    if site_df.empty:
-        return pd.DataFrame()
+    Args:
+        site_df (pandas.DataFrame): Dataframe containing IMPROVER and
+                                    airport data
+        cols (list): Columns to get values for
+    Returns:
+        values_50 (pandas.DataFrame): 50th percentile values for each row
+    """
+    # Match rows on airport and time
+    keys = ['airport_ind', 'time']
 
-    # Add time info to dataframe
-    site_df['taf_time'] = site_df['time'].map(site_dts)
+    # Get 50th percentile values for each key (using first row if more
+    # than one)
+    perc_50 = site_df.loc[site_df['percentile'] == 50, keys + cols]
+    perc_50 = perc_50.drop_duplicates(keys)
 
-    # Add taf type to as column for applying functions to rows
-    site_df['rules_col'] = site_info['rules']
+    # Broadcast these to all rows
+    values_50 = site_df[keys].merge(perc_50, how='left', on=keys)[cols]
+    values_50.index = site_df.index
 
-    # Update values - e.g. ensure correct units, round values if
-    # necessary and ensure internal consistency between visibility,
-    # cloud and sig wx
-    site_df = update_values(site_df)
+    return values_50
 
-    # Add required airport info as attributes to site_df
-    vrbs = ['rules', 'airport_name', 'icao', 'taf_issue', 'taf_start', 'bench']
-    site_df.attrs = {vrb: site_info[vrb] for vrb in vrbs}
 
-    return site_df
+def get_spot_tar(blend_str):
+    """
+    Copies spot tar file for blend time from MASS.
+
+    Args:
+        blend_str (str): String containing blend date.
+    Returns:
+        tar_file (str): Location of tar file
+    """
+    # Extract tar file from MASS
+    tar_file = f'{DATA_DIR}/{blend_str}00Z_spot.tar'
+    moo_cmd = subprocess.run(
+        ['moo', 'get', f'{MASS_DIR}/mix_suite_{blend_str}00Z/spot.tar',
+         tar_file],
+         check=False, capture_output=True, encoding="utf-8"
+    )
+
+    # Exit if file not on MASS
+    if moo_cmd.returncode not in [0]:
+        print('Return code', moo_cmd.returncode)
+        raise FileNotFoundError("archive not found on mass")
+
+    return tar_file
 
 
 def get_start_end_dts(taf_start, open_hr, close_hr, taf_len):
@@ -611,7 +883,111 @@ def get_taf_hrs(airport_info, taf_start_dt):
     return airport_info, all_hours
 
 
-def load_filter_data(param, sites_con, perc_con, taf_dts, fname, blend_str):
+def index_tar_listing(fnames_in_tar, blend_str):
+    """
+    Indexes all IMPROVER spot files listed in a tar file in a single
+    pass, so that files needed for each parameter can be looked up
+    without rescanning the listing or probing the filesystem.
+
+    Args:
+        fnames_in_tar (list): Names of all files in tar archive
+        blend_str (str): Blend time string
+    Returns:
+        tar_index (dict): Names of files in tar archive keyed by file name
+                          start, parameter, validity time and blend minute
+    """
+    tar_index = {}
+    for name in fnames_in_tar:
+
+        # Only include IMPROVER spot files from required blend time
+        directory, base_name = os.path.split(name)
+        if os.path.basename(directory) != 'spot':
+            continue
+        match = SPOT_FNAME_RE.fullmatch(base_name)
+        if match is None or match['blend'] != blend_str:
+            continue
+
+        # Add to index
+        key = (match['prefix'], match['param'], match['vt'], match['minute'])
+        tar_index[key] = name
+
+    return tar_index
+
+
+def load_filter_arrays(param, sites, taf_dts, fname, spot_index):
+    """
+    Loads in all required IMPROVER data for a single weather parameter
+    by reading site and percentile slices of each file straight into
+    arrays, without building iris cubes. Returns the same dataframe and
+    missing times as load_filter_data.
+
+    Args:
+        param (str): Weather parameter used for IMPROVER file name
+        sites (list): Site number strings
+        taf_dts (list): List of datetimes revevant for TAF period
+        fname (str): String with start of fname
+        spot_index (dict): Spot file locations keyed by file name start,
+                           parameter, validity time and blend minute
+    Returns:
+        param_df (pandas.DataFrame): Dataframe containing IMPROVER data
+        missing_times (list): List of any times missing from IMPROVER
+    """
+    # Get parameter info from configs
+    param_configs = co.IMPROVER_PARAMETERS[param]
+    if param_configs['data_type'] == 'percentiles':
+        percentiles = co.PERCENTILES
+    else:
+        percentiles = None
+
+    # Collect column arrays for each time and any times of missing files
+    columns = {'time': [], 'percentile': [], 'site': [], 'value': []}
+    missing_times = []
+
+    # Loop through all required taf dts, mapping each tar file only once
+    # and unmapping them all when done
+    with open_tar_mmaps() as tar_mmaps:
+        for tdt in taf_dts:
+
+            # Find file in index, adding to missing times if not found
+            tdt_str = tdt.strftime('%Y%m%dT%H%MZ')
+            location = find_spot_file(spot_index, fname, param, tdt_str)
+            if location is None:
+                missing_times.append(tdt)
+                continue
+
+            # Read required slices of data
+            percs, site_ids, data = read_spot_file(
+                location, sites, percentiles, param_configs['units'],
+                tar_mmaps
+            )
+
+            # Flatten into columns (percentile-major, as in iris
+            # dataframes)
+            columns['time'].append(np.full(data.size, tdt, dtype=object))
+            columns['percentile'].append(np.repeat(percs, len(site_ids)))
+            columns['site'].append(np.tile(site_ids, len(percs)))
+            columns['value'].append(data.ravel())
+
+    # Equivalent of failing to merge an empty cube list
+    if not columns['value']:
+        raise FileNotFoundError(f'No files found for {param}')
+
+    # Collect into dataframe, with same column order as iris dataframes
+    # (keeping times as datetime objects, as in iris dataframes)
+    short_name = param_configs['short_name']
+    param_df = pd.DataFrame({
+        'time': pd.Series(np.concatenate(columns['time']), dtype=object),
+        'percentile': np.concatenate(columns['percentile']),
+        'site': np.concatenate(columns['site']),
+        short_name: np.concatenate(columns['value'])
+    })
+    if percentiles is None:
+        param_df = param_df[['time', 'site', short_name, 'percentile']]
+
+    return param_df, missing_times
+
+
+def load_filter_data(param, sites_con, perc_con, taf_dts, fname, spot_index):
     """
     Loads in all required IMPROVER data for a single weather parameter,
     sorting as necessary, converting to a dataframe and returning as
@@ -623,7 +999,8 @@ def load_filter_data(param, sites_con, perc_con, taf_dts, fname, blend_str):
         perc_con (iris.Constraint): Constraint for percentiles
         taf_dts (list): List of datetimes revevant for TAF period
         fname (str): String with start of fname
-        blend_str (str): Blend time string
+        spot_index (dict): Spot file paths keyed by file name start,
+                           parameter, validity time and blend minute
     Returns:
         param_df (pandas.DataFrame): Dataframe containing IMPROVER data
         missing_times (list): List of any times missing from IMPROVER
@@ -640,39 +1017,24 @@ def load_filter_data(param, sites_con, perc_con, taf_dts, fname, blend_str):
         # Convert TAF dt to string
         tdt_str = tdt.strftime('%Y%m%dT%H%MZ')
 
-        # Indicator for whether file found in archive
-        file_found = False
-
-        # Get latest blend time possible
-        for minutes in ['45', '30', '15', '00']:
-
-            # Define file and test if it exists
-            tdt_file = (f'{DATA_DIR}/{blend_str}00Z/{fname}{tdt_str}'
-                        f'-B{blend_str}{minutes}Z-{param}.nc')
-            if not os.path.exists(tdt_file):
-                continue
-
-            # Indicate that file has been found
-            file_found = True
-
-            # Load cube - how cube is loaded depends on type
-            if co.IMPROVER_PARAMETERS[param]['data_type'] == 'percentiles':
-                tdt_cube = iris.load_cube(tdt_file, sites_con & perc_con)
-            elif co.IMPROVER_PARAMETERS[param]['data_type'] == 'deterministic':
-                tdt_cube = iris.load_cube(tdt_file, sites_con)
-            else:
-                tdt_cube = iris.load_cube(tdt_file, sites_con)
-
-            # Break for loop if suitable cube found
-            break
-
-        # Add to cube list (if suitable file found)
-        if file_found:
-            param_cube_list.append(tdt_cube)
+        # Find file from latest blend time possible
+        tdt_file = find_spot_file(spot_index, fname, param, tdt_str)
 
         # If no file, add to missing times
-        else:
+        if tdt_file is None:
             missing_times.append(tdt)
+            continue
+
+        # Load cube - how cube is loaded depends on type
+        if co.IMPROVER_PARAMETERS[param]['data_type'] == 'percentiles':
+            tdt_cube = iris.load_cube(tdt_file, sites_con & perc_con)
+        elif co.IMPROVER_PARAMETERS[param]['data_type'] == 'deterministic':
+            tdt_cube = iris.load_cube(tdt_file, sites_con)
+        else:
+            tdt_cube = iris.load_cube(tdt_file, sites_con)
+
+        # Add to cube list
+        param_cube_list.append(tdt_cube)
 
     # Merge cubes
     equalise_attributes(param_cube_list)
@@ -703,6 +1065,166 @@ def load_filter_data(param, sites_con, perc_con, taf_dts, fname, blend_str):
     return param_df, missing_times
 
 
+def open_spot_file(location, tar_mmaps):
+    """
+    Opens an IMPROVER spot file, either from the filesystem or from a
+    memory-mapped view of the tar file containing it.
+
+    Args:
+        location (str or tuple): File path, or tar file path along with
+                                 offset and size of file in tar file
+        tar_mmaps (dict): Memory-mapped tar files keyed by tar file path
+                          (see open_tar_mmaps)
+    Returns:
+        dataset (netCDF4.Dataset): Spot file dataset
+    """
+    # Extracted files can be opened directly
+    if isinstance(location, str):
+        return netCDF4.Dataset(location)
+
+    # Otherwise, read file from memory-mapped tar file (only mapping
+    # each tar file once per load)
+    tar_file, offset, size = location
+    if tar_file not in tar_mmaps:
+        with open(tar_file, 'rb') as file_object:
+            tar_mmaps[tar_file] = mmap.mmap(file_object.fileno(), 0,
+                                            access=mmap.ACCESS_READ)
+    memory = memoryview(tar_mmaps[tar_file])[offset:offset + size]
+    dataset = netCDF4.Dataset(f'{tar_file}:{offset}', memory=memory)
+
+    return dataset
+
+
+@contextlib.contextmanager
+def open_tar_mmaps():
+    """
+    Provides a store for tar files memory-mapped while loading data,
+    closing the maps (and the file descriptors they hold) once loading
+    is finished.
+
+    Returns:
+        tar_mmaps (dict): Memory-mapped tar files keyed by tar file path
+    """
+    tar_mmaps = {}
+    try:
+        yield tar_mmaps
+    finally:
+        for tar_mmap in tar_mmaps.values():
+            tar_mmap.close()
+
+
+def read_spot_file(location, sites, percentiles, units, tar_mmaps):
+    """
+    Reads the required site and percentile slices from an IMPROVER spot
+    file, converting units if necessary. Only the hyperslab spanning the
+    required sites and percentiles is read from the file.
+
+    Args:
+        location (str or tuple): Location of spot file (see
+                                 open_spot_file)
+        sites (list): Site number strings
+        percentiles (list): Percentiles required (None if file is not a
+                            percentile file)
+        units (str): Units to convert to (None if no conversion needed)
+        tar_mmaps (dict): Memory-mapped tar files keyed by tar file path
+                          (see open_tar_mmaps)
+    Returns:
+        percs (np.array): Percentiles (50 if not a percentile file)
+        site_ids (np.array): Site numbers
+        data (np.array): Data with shape (percentiles, sites)
+    """
+    with open_spot_file(location, tar_mmaps) as dataset:
+
+        # Data variable is the only variable that is not a dimension or
+        # auxiliary coordinate
+        coord_names = set(dataset.dimensions)
+        for var in dataset.variables.values():
+            coord_names.update(getattr(var, 'coordinates', '').split())
+        data_var = max((var for name, var in dataset.variables.items()
+                        if name not in coord_names), key=lambda var: var.ndim)
+
+        # Get site numbers, decoding from character array if necessary
+        site_var = dataset.variables['met_office_site_id']
+        site_ids = np.ma.getdata(site_var[:])
+        if site_ids.ndim > 1:
+            site_ids = netCDF4.chartostring(site_ids)
+        site_ids = site_ids.astype(str)
+        site_inds = np.flatnonzero(np.isin(site_ids, sites))
+
+        # Get percentile indices if necessary
+        if percentiles is not None:
+            perc_points = np.ma.getdata(dataset.variables['percentile'][:])
+            perc_inds = np.flatnonzero(np.isin(perc_points, percentiles))
+            percs = perc_points[perc_inds]
+        else:
+            percs = np.array([50])
+
+        # Define hyperslab covering required sites and percentiles (any
+        # other dimensions should be of length 1)
+        slices, inds = [], {}
+        for dim in data_var.dimensions:
+            if dim == site_var.dimensions[0]:
+                dim_inds = site_inds
+            elif dim == 'percentile' and percentiles is not None:
+                dim_inds = perc_inds
+            else:
+                slices.append(0)
+                continue
+            if not dim_inds.size:
+                return percs, site_ids[site_inds].astype(int), np.empty(
+                    (len(percs), 0))
+            slices.append(slice(dim_inds[0], dim_inds[-1] + 1))
+            inds[dim] = dim_inds - dim_inds[0]
+
+        # Read hyperslab and take required indices, ensuring percentile
+        # is the first dimension
+        data = data_var[tuple(slices)]
+        for axis, dim_inds in enumerate(inds.values()):
+            data = np.take(data, dim_inds, axis=axis)
+        if len(inds) == 1:
+            data = data[np.newaxis, :]
+        elif list(inds)[0] != 'percentile':
+            data = data.T
+
+        # Masked points become nans, as in iris dataframes
+        if np.ma.is_masked(data):
+            data = np.ma.filled(data.astype(float), np.nan)
+        else:
+            data = np.ma.getdata(data)
+
+        # Convert to required units if necessary
+        if units:
+            data = Unit(data_var.units).convert(data, Unit(units))
+
+    return percs, site_ids[site_inds].astype(int), data
+
+
+def round_cld_col(clds):
+    """
+    Rounds cloud bases appropriately. Vectorised version of
+    calculations.round_cld.
+
+    Args:
+        clds (pandas.Series): Raw cloud base values
+    Returns:
+        rounded_clds (numpy.ndarray): Rounded cloud values
+    """
+    clds = np.asarray(clds, dtype=float)
+
+    # Missing values can't be rounded (calculations.round_cld also
+    # fails on these)
+    if not np.isfinite(clds).all():
+        raise ValueError('Cannot round non-finite cloud base values')
+
+    # Force to 5000ft for high cloud, round down to nearest 500ft for
+    # cloud between 1500 and 5000ft and nearest 100ft for anything lower
+    rounded_clds = np.select([clds >= 5000, clds >= 1500],
+                             [5000, np.floor(clds / 500.0) * 500.0],
+                             np.floor(clds / 100.0) * 100)
+
+    return rounded_clds.astype(int)
+
+
 def round_dir(wdir):
     """
     Rounds wind direction to nearest 10 degrees.
@@ -727,6 +1249,62 @@ def round_dir(wdir):
     return rounded_dir
 
 
+def round_dir_col(wdirs):
+    """
+    Rounds wind directions to nearest 10 degrees. Vectorised version of
+    round_dir.
+
+    Args:
+        wdirs (pandas.Series): Raw wind directions
+    Return:
+        rounded_dirs (numpy.ndarray): Rounded wind directions
+    """
+    # Round directions to nearest 10 (nans are left as they are)
+    rounded_dirs = 10 * np.round(np.asarray(wdirs, dtype=float) / 10)
+
+    # Change any 360s to 0
+    rounded_dirs[rounded_dirs == 360] = 0
+
+    # Use integers if possible
+    if not np.isnan(rounded_dirs).any():
+        rounded_dirs = rounded_dirs.astype(int)
+
+    return rounded_dirs
+
+
+def round_vis_col(site_df):
+    """
+    Rounds visibility appropriately for all rows of dataframe.
+    Vectorised version of round_vis_row.
+
+    Args:
+        site_df (pandas.DataFrame): Dataframe containing IMPROVER and
+                                    airport data
+    Return:
+        rounded_vis (numpy.ndarray): Rounded visibility values
+    """
+    vis = site_df['vis'].to_numpy(dtype=float)
+    defence = site_df['rules_col'].to_numpy() == 'defence'
+
+    # Missing values can't be rounded (calculations.round_vis also
+    # fails on these)
+    if not np.isfinite(vis).all():
+        raise ValueError('Cannot round non-finite visibility values')
+
+    # Force 9999 if visibility in top category, round down to nearest
+    # 1000m between 5000m and top category, nearest 500m between 1500m and
+    # 5000m, make 400m if between 350m and 400m and round down to nearest
+    # 100m below 350m (with minimum of 100m)
+    conditions = [(vis >= 9999) | ((vis >= 8000) & defence), vis >= 5000,
+                  vis >= 1500, (vis < 400) & (vis >= 350)]
+    choices = [9999, np.floor(vis / 1000.0) * 1000.0,
+               np.floor(vis / 500.0) * 500.0, 400]
+    rounded_vis = np.select(conditions, choices,
+                            np.maximum(100, np.floor(vis / 100.0) * 100.0))
+
+    return rounded_vis.astype(int)
+
+
 def round_vis_row(row):
     """
     Rounds visibility appropriately on row of dataframe.
@@ -742,6 +1320,40 @@ def round_vis_row(row):
     return rounded_vis
 
 
+def stream_data(blend_str):
+    """
+    Gets relevant data from MASS without extracting it from the tar
+    file. Instead, required spot files are indexed by their position in
+    the tar file so they can be read from a memory-mapped view of it.
+
+    Args:
+        blend_str (str): String containing blend date.
+    Returns:
+        param_fnames (dict): Start of file names for each parameter
+        spot_index (dict): Spot file locations keyed by file name start,
+                           parameter, validity time and blend minute
+    """
+    # Get tar file from MASS
+    tar_file = get_spot_tar(blend_str)
+
+    # Read names and positions of all files in tar file in one pass
+    with tarfile.open(tar_file) as tar:
+        members = {member.name: member for member in tar.getmembers()
+                   if member.isfile()}
+
+    # Index files in tar file, then get files needed for TAF generation
+    tar_index = index_tar_listing(list(members), blend_str)
+    param_fnames, spot_keys = get_param_fnames(tar_index)
+
+    # Index required files by their position in the tar file
+    spot_index = {}
+    for key in spot_keys:
+        member = members[tar_index[key]]
+        spot_index[key] = (tar_file, member.offset_data, member.size)
+
+    return param_fnames, spot_index
+
+
 def update_sig_wx(row):
     """
     Converts sig wx codes to TAF-specific strings.
@@ -776,6 +1388,38 @@ def update_sig_wx(row):
     return wx_str
 
 
+def update_sig_wx_col(site_df):
+    """
+    Converts sig wx codes to TAF-specific strings for all rows of
+    dataframe. Updated codes only depend on the original code, TAF rules
+    and which side of the thresholds used in checks.check_rate and
+    checks.check_mist_fog precip rate, visibility and temperature lie,
+    so update_sig_wx is only applied once for each combination of these.
+
+    Args:
+        site_df (pandas.DataFrame): Dataframe containing IMPROVER and
+                                    airport data
+    Return:
+        wx_strs (numpy.ndarray): Sig wx codes
+    """
+    precip_rate = site_df['precip_rate'].to_numpy(dtype=float)
+    vis = site_df['vis'].to_numpy(dtype=float)
+    temp = site_df['temp'].to_numpy(dtype=float)
+
+    # Define keys from sig wx code, rules and thresholds
+    keys = [site_df['sig_wx'], site_df['rules_col'], temp < 0,
+            precip_rate <= 0.1]
+    keys += [precip_rate < limit for limit in [0.5, 2, 4, 10]]
+    keys += [vis < limit for limit in [1000, 9999]]
+    keys += [vis >= limit for limit in [1000, 5000, 9999]]
+    keys += [vis <= 5000, vis == 5000, vis > 5000]
+
+    # Update sig wx codes
+    wx_strs = apply_by_key(update_sig_wx, site_df, keys)
+
+    return wx_strs
+
+
 def update_sig_wx_for_new_vis(row):
     """
     Similar to update_sig_wx, but only updates sig wx code based on new
@@ -810,42 +1454,40 @@ def update_values(site_df):
 
     # Also, ensure cloud values are all above zero
     for cld in ['cld_3', 'cld_5']:
-        site_df[cld][site_df[cld] < 0] = 0
+        site_df.loc[site_df[cld] < 0, cld] = 0
 
     # Round cloud and visibility values to those generally used in TAFs
     for cld_param in ['cld_3', 'cld_5']:
-        site_df[cld_param] = site_df[cld_param].apply(ca.round_cld)
-    site_df['vis'] = site_df.apply(round_vis_row, axis=1)
+        site_df[cld_param] = round_cld_col(site_df[cld_param])
+    site_df['vis'] = round_vis_col(site_df)
 
     # Round wind values
     site_df = site_df.round({'wind_mean': 0, 'wind_gust': 0})
-    site_df['wind_dir'] = site_df['wind_dir'].apply(round_dir)
+    site_df['wind_dir'] = round_dir_col(site_df['wind_dir'])
 
     # As no non-50th percentile values for wind dirs, make all
     # percentiles the same as the 50th percentile values
-    dirs_50 = site_df.loc[site_df['percentile'] == 50, 'wind_dir'].values
-    for perc in co.PERCENTILES:
-        site_df.loc[site_df['percentile'] == perc, 'wind_dir'] = dirs_50
+    site_df['wind_dir'] = get_perc_50_values(site_df, ['wind_dir'])['wind_dir']
 
     # For really low visibilities, force cloud to be on the surface
     site_df.loc[site_df['vis'] <= 500, ['cld_3', 'cld_5']] = 0
 
     # Convert sig wx codes and adjust to give TAF-appropriate values
-    site_df['sig_wx'] = site_df.apply(update_sig_wx, axis=1)
+    site_df['sig_wx'] = update_sig_wx_col(site_df)
 
     # Need to estimate sig wx for 30th, 40th, 60th and 70th percentiles
     # (not available in IMPROVER)
     site_df = fill_in_sig_wxs(site_df)
 
     # Adjust visibility based on cloud base, wind and sig wx
-    site_df['vis'] = site_df.apply(update_vis, axis=1)
+    site_df['vis'] = update_vis_col(site_df)
 
     # Update wx again with new visibilities
-    site_df['sig_wx'] = site_df.apply(update_sig_wx, axis=1)
+    site_df['sig_wx'] = update_sig_wx_col(site_df)
 
     # Get visibility and cloud TAF categories
-    site_df['vis_cat'] = site_df.apply(vis_cat_row, axis=1)
-    site_df['cld_cat'] = site_df.apply(cld_cat_row, axis=1)
+    site_df['vis_cat'] = vis_cat_col(site_df)
+    site_df['cld_cat'] = cld_cat_col(site_df)
 
     return site_df
 
@@ -869,6 +1511,96 @@ def update_vis(row):
     return vis
 
 
+def update_vis_col(site_df):
+    """
+    Checks how visibility lines up with cloud, wind and sig wx forecasts
+    for all rows of dataframe. Vectorised version of update_vis.
+
+    Args:
+        site_df (pandas.DataFrame): Dataframe containing IMPROVER and
+                                    airport data
+    Return:
+        vis (numpy.ndarray): Updated visibility values
+    """
+    vis = site_df['vis'].to_numpy()
+    cld_5 = site_df['cld_5'].to_numpy(dtype=float)
+    wind_mean = site_df['wind_mean'].to_numpy(dtype=float)
+
+    # Check against cloud and wind, using rules for lowest cloud base
+    # limit that cloud is below
+    unchecked = np.ones(len(vis), dtype=bool)
+    for cld_limit, rules in co.VIS_CLD_WIND_RULES.items():
+        cld_rows = unchecked & (cld_5 < cld_limit)
+        vis_limits = np.select([wind_mean <= wind_limit
+                                for wind_limit in rules['wind']],
+                               rules['vis'][:-1], rules['vis'][-1])
+        vis = np.where(cld_rows, np.minimum(vis, vis_limits), vis)
+        unchecked &= ~cld_rows
+
+    # Get visibility limits for each sig wx code
+    sig_wxs = site_df['sig_wx']
+    threshs, new_viss = {}, {}
+    for sig_wx in sig_wxs.unique():
+        vis_limit = ch.sig_wx_vis_limit(sig_wx)
+        threshs[sig_wx], new_viss[sig_wx] = vis_limit or (np.inf, 0)
+
+    # Check against sig wx code
+    vis = np.where(vis >= sig_wxs.map(threshs).to_numpy(dtype=float),
+                   sig_wxs.map(new_viss).to_numpy(), vis)
+
+    return vis
+
+
+def vis_cat_col(site_df):
+    """
+    Determines visibility TAF categories for all rows of dataframe.
+    Vectorised version of vis_cat_row.
+
+    Args:
+        site_df (pandas.DataFrame): Dataframe containing IMPROVER and
+                                    airport data
+    Return:
+        vis_cats (numpy.ndarray): Visibility categories
+    """
+    vis = site_df['vis'].to_numpy(dtype=float)
+    rules = site_df['rules_col'].to_numpy()
+
+    # Determine category in which fog may or may not be present, adding
+    # 0.5 if fog present to distinguish between fog and no fog
+    sig_wxs = site_df['sig_wx']
+    fog = sig_wxs.map({sig_wx: 'FG' in sig_wx
+                       for sig_wx in sig_wxs.unique()}).to_numpy(dtype=bool)
+    fg_cat = np.where(rules == 'defence', 2., 3.) + np.where(fog, 0.5, 0.)
+
+    # Thresholds/categories for each type of TAF rules
+    rules_thresholds_categories = {
+        'defence': ([8000, 5000, 3700, 2500, 1600, 800, 0],
+                    [7., 6., 5., 4., 3., fg_cat, 1.]),
+        'offshore': ([9999, 7000, 5000, 3000, 1500, 800, 350, 0],
+                     [8., 7., 6., 5., 4., fg_cat, 2., 1.]),
+        'civil': ([9999, 5000, 1500, 800, 350, 0],
+                  [6., 5., 4., fg_cat, 2., 1.])
+    }
+
+    # Determine categories based on thresholds and categories
+    rules_cats = {}
+    for rules_type, (thresholds, categories) in \
+            rules_thresholds_categories.items():
+        rules_cats[rules_type] = np.select(
+            [vis >= threshold for threshold in thresholds], categories,
+            np.nan
+        )
+
+    # Choose categories based on TAF rules (civil if not defence or
+    # offshore)
+    vis_cats = np.select(
+        [rules == 'defence', rules == 'offshore'],
+        [rules_cats['defence'], rules_cats['offshore']], rules_cats['civil']
+    )
+
+    return vis_cats
+
+
 def vis_cat_row(row):
     """
     Determines visibility TAF category based on info in row of
@@ -0,0 +1,171 @@
+"""
+Persistent on-disk cache of IMPROVER parameter data, so that reruns for
+the same TAF start time do not need to fetch data from MASS or decode
+NetCDF files again. Parameter dataframes are stored as Parquet files,
+named by a hash of everything they depend on (including a cache version
+that changes whenever the loaders change the data they produce), and
+the least recently used files are removed when the cache grows too
+large. The cache is only used if the CACHE_DIR environment variable is
+set.
+
+Functions:
+    cache_path: Gets cache file path for parameter data.
+    evict_files: Removes least recently used files from cache.
+    read_param: Reads parameter data from cache.
+    write_param: Writes parameter data to cache.
+"""
+import hashlib
+import json
+import os
+from datetime import datetime
+
+import pandas as pd
+
+# Define environment constants
+CACHE_DIR = os.environ.get('CACHE_DIR')
+CACHE_MAX_MB = float(os.environ.get('CACHE_MAX_MB', 2000))
+
+# Version of cached data - change whenever loaders change the data they
+# produce so that files written by older loaders are not used
+CACHE_VERSION = 'improver-spot-1'
+
+
+def cache_path(blend_str, param, percentiles, sites):
+    """
+    Gets path of cache file for parameter data, named by a hash of the
+    cache version, blend time, parameter, percentiles and sites.
+
+    Args:
+        blend_str (str): Blend time string
+        param (str): Weather parameter used for IMPROVER file name
+        percentiles (list): Percentiles loaded
+        sites (list): Site number strings
+    Returns:
+        path (str): Path of cache file
+    """
+    # Hash everything the parameter data depends on
+    key = json.dumps([CACHE_VERSION, blend_str, param, sorted(percentiles),
+                      sorted(sites)])
+    digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+    path = f'{CACHE_DIR}/{digest}.parquet'
+
+    return path
+
+
+def evict_files():
+    """
+    Removes least recently used files from cache until the total size of
+    the cache is below the maximum allowed size.
+    """
+    # Get size and last used time of all cache files
+    files = []
+    with os.scandir(CACHE_DIR) as entries:
+        for entry in entries:
+            if entry.name.endswith('.parquet'):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+
+    # Remove oldest files until cache is small enough
+    total_size = sum(size for _, size, _ in files)
+    max_size = CACHE_MAX_MB * 1024 ** 2
+    for _, size, path in sorted(files):
+        if total_size <= max_size:
+            break
+
+        # Another process may already have removed the file
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total_size -= size
+
+
+def read_param(blend_str, param, percentiles, sites):
+    """
+    Reads parameter data from cache, marking the cache file as recently
+    used.
+
+    Args:
+        blend_str (str): Blend time string
+        param (str): Weather parameter used for IMPROVER file name
+        percentiles (list): Percentiles loaded
+        sites (list): Site number strings
+    Returns:
+        param_df_missing_times (tuple): Dataframe containing IMPROVER
+                                        data and missing times (None if
+                                        not in cache)
+    """
+    # Only import pyarrow if cache is used
+    import pyarrow.parquet as pq
+
+    # Return None if data not in cache
+    path = cache_path(blend_str, param, percentiles, sites)
+    try:
+        table = pq.read_table(path)
+    except FileNotFoundError:
+        return None
+
+    # Mark file as recently used
+    os.utime(path)
+
+    # Convert to dataframe, with times as datetime objects as produced by
+    # the loaders
+    param_df = table.to_pandas()
+    param_df['time'] = pd.Series([tdt.to_pydatetime()
+                                  for tdt in param_df['time']], dtype=object)
+
+    # Get missing times from file metadata
+    missing_times = [datetime.fromisoformat(tdt) for tdt in
+                     json.loads(table.schema.metadata[b'missing_times'])]
+
+    return param_df, missing_times
+
+
+def write_param(blend_str, param, percentiles, sites, param_df,
+                missing_times):
+    """
+    Writes parameter data to cache, then removes least recently used
+    files if the cache is too large.
+
+    Args:
+        blend_str (str): Blend time string
+        param (str): Weather parameter used for IMPROVER file name
+        percentiles (list): Percentiles loaded
+        sites (list): Site number strings
+        param_df (pandas.DataFrame): Dataframe containing IMPROVER data
+        missing_times (list): List of any times missing from IMPROVER
+    """
+    # Only import pyarrow if cache is used
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # Make cache directory if necessary
+    if not os.path.exists(CACHE_DIR):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+
+    # Convert to table, storing missing times in metadata
+    param_df = param_df.copy()
+    param_df['time'] = pd.to_datetime(
+        [datetime(tdt.year, tdt.month, tdt.day, tdt.hour, tdt.minute)
+         for tdt in param_df['time']]
+    )
+    table = pa.Table.from_pandas(param_df, preserve_index=False)
+    m_times = json.dumps([tdt.isoformat() for tdt in missing_times])
+    metadata = {**(table.schema.metadata or {}),
+                b'missing_times': m_times.encode('utf-8')}
+    table = table.replace_schema_metadata(metadata)
+
+    # Write to temporary file first so readers never see partial files,
+    # removing temporary file if writing fails
+    path = cache_path(blend_str, param, percentiles, sites)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    try:
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    # Keep cache within size limit
+    evict_files()
@@ -4,12 +4,17 @@ Generates TAFs.
 Functions:
     get_base_conditions: Determines appropriate base conditions.
     get_becmgs: Finds and collects BECMG group information.
-    get_taf_options: Creates a list of possible TAFs.
+    get_best_option: Finds best TAF option for BECMG options.
+    get_best_option_parallel: Finds best TAF option in parallel.
+    get_best_option_shared: Finds best TAF option using shared data.
+    get_shared_site_data: Gets site data from shared memory.
     get_tempos: Finds TEMPO and PROB groups.
+    option_rank: Gets rank of TAF option.
     taf_gen: Main function to generate TAF.
 """
-from multiprocessing import Process, Queue
-import random
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait
+from multiprocessing import shared_memory
+import pickle
 
 import numpy as np
 
@@ -20,6 +25,13 @@ import bases_changes.tempos as te
 import common.calculations as ca
 import organise.write_taf as wt
 
+# Site data loaded from shared memory, cached in each worker process
+SITE_DATA_CACHE = {}
+
+# PROB/TEMPO groups found for site data in shared memory, cached in each
+# worker process
+TEMPOS_CACHE = {}
+
 
 def get_base_conditions(site_data):
     """
@@ -78,44 +90,64 @@ def get_becmgs(site_data, bases):
         site_data (pandas.DataFrame): IMPROVER and airport data
         bases (dict): Initial base conditions
     Returns:
-        all_bases_becmgs (list): All base conditions and BECMG changes
+        becmg_options (list): BECMG options (be.BecmgOption), each with
+                              base conditions and BECMG changes
     """
     # Get required IMPROVER data
     tdf_50 = site_data[(site_data['percentile'] == 50)]
     tdf_taf = tdf_50[tdf_50['taf_time'].isin(['during', 'after'])]
 
     # Start with one option containing initial base conditions
-    becmg_options = [{'groups': [bases], 'data': tdf_taf,  'score': 0,
-                      'finished': False}]
+    becmg_options = [be.new_option(bases)]
     keep_searching = True
 
-    # Find options for BECMG groups
+    # Find options for BECMG groups, sharing results between options
+    # with the same remaining data and base conditions
+    memo = {}
     while keep_searching:
-        becmg_options, keep_searching = be.find_becmg(becmg_options)
+        becmg_options, keep_searching = be.find_becmg(becmg_options, tdf_taf,
+                                                      memo)
 
     return becmg_options
 
 
-def get_taf_options(becmg_options_chunk, site_data):
+def get_best_option(becmg_options_chunk, site_data, memo):
     """
-    Creates a list of possible TAFs.
+    Finds the best TAF option (see option_rank) for a chunk of BECMG
+    options. BECMG options are skipped before looking for PROB/TEMPO
+    groups if a lower bound of the number of groups in the resulting TAF
+    option shows it cannot beat the best TAF option so far.
 
     Args:
         becmg_options_chunk (list): Chunk of BECMG options
         site_data (pandas.DataFrame): IMPROVER and airport data
+        memo (dict): PROB/TEMPO groups already found for site data
     Returns:
-        taf_options (list): TAF options
+        best_option (dict): Best TAF option
     """
-    # Find PROB/TEMPO groups for each BECMG option and collect resulting
-    # TAF options
-    taf_options = []
+    # Get required IMPROVER data for lower bound of TEMPO/PROB groups
+    tdf = site_data[site_data['taf_time'].isin(['during'])]
 
+    # Find PROB/TEMPO groups for each BECMG option and keep best
+    # resulting TAF option (the first if tied)
+    best_option = None
     for option in becmg_options_chunk:
 
         bases_becmgs = option['groups']
 
+        # Skip if option cannot beat best option so far - TAF option
+        # has at least the BECMG groups, plus one TEMPO/PROB group if
+        # any significant changes (only checked if this could matter)
+        if best_option is not None:
+            best_rank = option_rank(best_option)
+            if option_rank(option) >= best_rank:
+                continue
+            if ((len(bases_becmgs) + 1, option['score']) >= best_rank
+                    and te.min_tempos(tdf, bases_becmgs)):
+                continue
+
         # Add TEMPO/PROB groups for each weather parameter
-        all_groups, base_period = get_tempos(site_data, bases_becmgs)
+        all_groups, base_period = get_tempos(site_data, bases_becmgs, memo)
 
         # Optimise BECMG/TEMPO/PROB groups
         all_groups = op.optimise_groups(all_groups, site_data)
@@ -126,13 +158,143 @@ def get_taf_options(becmg_options_chunk, site_data):
         # FOR TESTING
         # wt.taf_text(site_data, all_groups)
 
-        # Add to TAF options, including BECMG score
-        taf_options.append({'score': option['score'], 'groups': all_groups})
+        # Update best option, including BECMG score
+        taf_option = {'score': option['score'], 'groups': all_groups}
+        if (best_option is None
+                or option_rank(taf_option) < option_rank(best_option)):
+            best_option = taf_option
+
+    return best_option
+
+
+def get_best_option_parallel(becmg_options, site_data, executor=None):
+    """
+    Finds the best TAF option, splitting BECMG options into chunks
+    processed in parallel. Site data is put in shared memory so that it
+    is only sent to each worker process once. TAF options are considered
+    as each chunk completes, keeping track of the best option so far and
+    cancelling chunks that can no longer beat it. Chunks that have
+    already started are left to finish before returning.
+
+    Args:
+        becmg_options (list): BECMG options
+        site_data (pandas.DataFrame): IMPROVER and airport data
+        executor (concurrent.futures.Executor): Pool of processes to use
+                                                (new pool used if None)
+    Returns:
+        best_option (dict): Best TAF option
+    """
+    # Split into chunks for multi-processing, getting index of first
+    # BECMG option in each chunk
+    chunks = np.array_split(becmg_options, min([len(becmg_options), 10]))
+    starts = np.cumsum([0] + [len(chunk) for chunk in chunks[:-1]])
+
+    # Put pickled site data in shared memory
+    site_bytes = pickle.dumps(site_data, protocol=pickle.HIGHEST_PROTOCOL)
+    shm = shared_memory.SharedMemory(create=True, size=len(site_bytes))
+    shm.buf[:len(site_bytes)] = site_bytes
+
+    # Use new pool of processes (one for each chunk) if none given
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=len(chunks))
+
+    # Find best TAF option for each chunk of BECMG options, keeping
+    # index of first option and best possible rank of TAF option from
+    # chunk (BECMG groups are never removed, and ties are broken by
+    # order of chunks)
+    futures = {}
+    try:
+        for chunk, start in zip(chunks, starts):
+            future = executor.submit(get_best_option_shared, chunk, shm.name)
+            futures[future] = (*min(option_rank(option) for option in chunk),
+                               start)
+
+        # Update best TAF option as each chunk completes
+        best_rank, best_option = None, None
+        unseen = set(futures)
+        for future in as_completed(futures):
+
+            # Ignore chunks cancelled below
+            unseen.remove(future)
+            if future.cancelled():
+                continue
+
+            # Compare best TAF option from chunk to best option so far
+            rank = (*option_rank(future.result()), futures[future][-1])
+            if best_rank is None or rank < best_rank:
+                best_rank, best_option = rank, future.result()
+
+            # Cancel chunks that cannot beat best option (only possible
+            # if not yet started) and stop if no chunks left that could
+            hopeless = [o_future for o_future in unseen
+                        if futures[o_future] > best_rank]
+            for o_future in hopeless:
+                o_future.cancel()
+            if len(hopeless) == len(unseen):
+                break
+
+    # Cancel chunks not yet started and wait for any still running, so
+    # that shared memory is not removed before they have loaded site
+    # data, then tidy up pool (if not given) and shared memory
+    finally:
+        wait([future for future in futures if not future.cancel()])
+        if own_executor:
+            executor.shutdown()
+        shm.close()
+        shm.unlink()
+
+    return best_option
+
+
+def get_best_option_shared(becmg_options_chunk, shm_name):
+    """
+    Finds the best TAF option for a chunk of BECMG options using site
+    data in shared memory.
+
+    Args:
+        becmg_options_chunk (list): Chunk of BECMG options
+        shm_name (str): Name of shared memory block containing pickled
+                        site data
+    Returns:
+        best_option (dict): Best TAF option
+    """
+    site_data = get_shared_site_data(shm_name)
+
+    # Share PROB/TEMPO groups between chunks processed in this process
+    # (only keeping latest)
+    if shm_name not in TEMPOS_CACHE:
+        TEMPOS_CACHE.clear()
+        TEMPOS_CACHE[shm_name] = {}
+
+    return get_best_option(becmg_options_chunk, site_data,
+                           TEMPOS_CACHE[shm_name])
+
+
+def get_shared_site_data(shm_name):
+    """
+    Gets site data from shared memory, only loading it once in each
+    process.
+
+    Args:
+        shm_name (str): Name of shared memory block containing pickled
+                        site data
+    Returns:
+        site_data (pandas.DataFrame): IMPROVER and airport data
+    """
+    # Load site data if not already loaded (only keeping latest)
+    if shm_name not in SITE_DATA_CACHE:
+        SITE_DATA_CACHE.clear()
+        shm = shared_memory.SharedMemory(name=shm_name)
+        try:
+            SITE_DATA_CACHE[shm_name] = pickle.loads(shm.buf)
+        finally:
+            shm.close()
 
-    return taf_options
+    return SITE_DATA_CACHE[shm_name]
 
 
-def get_tempos(site_data, all_groups):
+def get_tempos(site_data, all_groups, memo):
     """
     Finds TEMPO and PROB groups for each weather type (wind, vis/wx and
     cloud) and adds to change groups list.
@@ -140,6 +302,7 @@ def get_tempos(site_data, all_groups):
     Args:
         site_data (pandas.DataFrame): IMPROVER and airport data
         all_groups (dict): Base conditions and BECMG groups
+        memo (dict): PROB/TEMPO groups already found for site data
     Returns:
         all_groups (list): Base conditions and all change groups
     """
@@ -147,9 +310,9 @@ def get_tempos(site_data, all_groups):
     tdf = site_data[site_data['taf_time'].isin(['during'])]
 
     # Get TEMPO/PROB groups for each type of weather
-    all_groups = te.param_tempos(tdf, all_groups, 'wind')
-    all_groups = te.param_tempos(tdf, all_groups, 'vis')
-    all_groups = te.param_tempos(tdf, all_groups, 'cld')
+    all_groups = te.param_tempos(tdf, all_groups, 'wind', memo)
+    all_groups = te.param_tempos(tdf, all_groups, 'vis', memo)
+    all_groups = te.param_tempos(tdf, all_groups, 'cld', memo)
 
     # For updating base period with correct dts after optimising
     base_period = [tdf['time'].iloc[0], tdf['time'].iloc[-1]]
@@ -157,12 +320,38 @@ def get_tempos(site_data, all_groups):
     return all_groups, base_period
 
 
-def taf_gen(site_data):
+def option_rank(option):
+    """
+    Gets rank of TAF option - options with fewer groups are preferred,
+    then options with lower BECMG scores. For a BECMG option, this is
+    the best possible rank of the resulting TAF option.
+
+    Args:
+        option (dict): TAF option or BECMG option
+    Returns:
+        rank (tuple): Number of groups and BECMG score
+    """
+    rank = (len(option['groups']), option['score'])
+
+    return rank
+
+
+def taf_gen(site_data, executor=None, serial=False):
     """
-    Main function to generate TAF.
+    Main function to generate TAF. TAF options are created in parallel
+    using the given pool of processes (or a new one), unless serial is
+    True - e.g. if airports are already being processed in parallel.
 
     Args:
         site_data (pandas.DataFrame): IMPROVER and airport data
+        executor (concurrent.futures.Executor): Pool of processes to use
+                                                for TAF options
+        serial (bool): Indicator for whether to create TAF options in
+                       this process
+    Returns:
+        nice_taf (str): TAF in readable format
+        ver_taf (str): TAF in verification format
+        bench (str): Bench TAF is issued by
     """
     # Print out relevant data for testing and comparing to TAF
     # wt.print_data(site_data)
@@ -175,50 +364,19 @@ def taf_gen(site_data):
 
     # Reduce number of options by only taking options with minimum 
     # number of groups
-    min_groups = min(len(option['groups']) for option in becmg_options)
-    becmg_options = [opt for opt in becmg_options 
-                     if len(opt['groups']) == min_groups]
-
-    # Bit of a hack to limit ridiculous number of options
-    becmg_options = random.sample(becmg_options, min(len(becmg_options), 30))
+    min_groups = min(len(option.groups) for option in becmg_options)
+    becmg_options = [be.option_to_dict(opt) for opt in becmg_options
+                     if len(opt.groups) == min_groups]
 
-    # Split into chunks for multi-processing
+    # Find PROB/TEMPO groups for each BECMG option and pick TAF option
+    # with the smallest number of change groups (and the lowest BECMG
+    # score if multiple short TAFs)
     print(f'Number of BECMG options: {len(becmg_options)}')
-    chunks = np.array_split(becmg_options, min([len(becmg_options), 10]))
-
-    # Define variables for multiprocessing
-    queue = Queue()
-    processes = []
-
-    # Loop through becmg_options chunks, then find PROB/TEMPO groups for
-    # each BECMG option and collect resulting TAF options
-    for chunk in chunks:
-
-        # Define arguments for multiprocessing
-        args = (get_taf_options, [chunk, site_data], queue)
-
-        # Append process for multiprocessing
-        processes.append(Process(target=ca.mp_queue, args=args))
-
-    # Start processes
-    for process in processes:
-        process.start()
-
-    # Collect output from processes and close queue
-    all_taf_options = [queue.get() for _ in processes]
-    queue.close()
-
-    # Flatten options
-    all_taf_options = [option for options in all_taf_options
-                       for option in options]
-
-    # Get TAF options with least smallest number of change groups
-    min_groups = min(len(option['groups']) for option in all_taf_options)
-    shortest_tafs = [option for option in all_taf_options
-                     if len(option['groups']) == min_groups]
-
-    # If multiple short TAFs, pick the one with the lowest BECMG score
-    best_option = min(shortest_tafs, key=lambda x: x['score'])
+    if serial:
+        best_option = get_best_option(becmg_options, site_data, {})
+    else:
+        best_option = get_best_option_parallel(becmg_options, site_data,
+                                               executor)
 
     # Write TAF for best option
     nice_taf, ver_taf, bench = wt.taf_text(site_data, best_option['groups'])
@@ -0,0 +1,118 @@
+"""
+Benchmarks loading of IMPROVER data, comparing the iris cube loader
+against the columnar NetCDF loader and checking both give the same data.
+
+Functions:
+    compare_dfs: Checks that two parameter dataframes are the same.
+    main: Main function.
+    time_loader: Times loading of all parameters with a loader.
+"""
+import os
+import time
+from datetime import datetime, timedelta
+
+import iris
+import pandas as pd
+
+import common.configs as co
+import data_extraction.extract_sort_data as ex
+
+# Define environment constants
+TAF_START = os.environ['TAF_START']
+DATA_DIR = os.environ['DATA_DIR']
+BENCH_REPEATS = int(os.environ.get('BENCH_REPEATS', 3))
+
+
+def compare_dfs(param_df_iris, param_df_arrays):
+    """
+    Checks that parameter dataframes from both loaders are the same,
+    ignoring row order and the type of datetime object used for times.
+
+    Args:
+        param_df_iris (pandas.DataFrame): Data from iris loader
+        param_df_arrays (pandas.DataFrame): Data from columnar loader
+    """
+    dfs = []
+    for param_df in [param_df_iris, param_df_arrays]:
+
+        # Convert times (cftime in iris dataframes) to datetimes
+        param_df = param_df.copy()
+        param_df['time'] = [datetime(tdt.year, tdt.month, tdt.day, tdt.hour)
+                            for tdt in param_df['time']]
+
+        # Sort rows and columns
+        param_df = param_df.sort_values(['time', 'percentile', 'site'])
+        dfs.append(param_df.sort_index(axis=1).reset_index(drop=True))
+
+    pd.testing.assert_frame_equal(*dfs, check_dtype=False)
+
+
+def main():
+    """
+    Extracts data for TAF start time, then times and compares loaders.
+    """
+    # Get blend time and TAF datetimes as in get_imp_data
+    taf_start_dt = datetime.strptime(TAF_START, '%Y%m%d%H')
+    blend_str = (taf_start_dt - timedelta(hours=3)).strftime('%Y%m%dT%H')
+    airport_info = pd.read_csv(ex.AIRPORT_INFO_FILE, header=0)
+    airport_info, taf_dts = ex.get_taf_hrs(airport_info, taf_start_dt)
+
+    # Define site/percentile constraints for both loaders
+    sites = [f'{site:08d}' for site in list(airport_info['site_number'])]
+    sites_con = iris.Constraint(met_office_site_id=sites)
+    perc_con = iris.Constraint(percentile=co.PERCENTILES)
+
+    # Extract data from MASS
+    param_fnames, spot_index = ex.extract_data(blend_str)
+
+    # Arguments for each loader
+    def iris_args(param, fname):
+        return [param, sites_con, perc_con, taf_dts, fname, spot_index]
+
+    def arrays_args(param, fname):
+        return [param, sites, taf_dts, fname, spot_index]
+
+    # Time both loaders and compare outputs
+    iris_time, iris_dfs = time_loader(ex.load_filter_data, iris_args,
+                                      param_fnames)
+    arrays_time, arrays_dfs = time_loader(ex.load_filter_arrays, arrays_args,
+                                          param_fnames)
+    for param in param_fnames:
+        compare_dfs(iris_dfs[param][0], arrays_dfs[param][0])
+        assert iris_dfs[param][1] == arrays_dfs[param][1], 'Missing times'
+
+    print(f'iris loader: {iris_time:.2f}s')
+    print(f'arrays loader: {arrays_time:.2f}s')
+    print(f'Speed up: {iris_time / arrays_time:.1f}x')
+
+    # Remove blend time data files
+    os.system(f'rm -r {DATA_DIR}/{blend_str}*')
+
+
+def time_loader(loader, loader_args, param_fnames):
+    """
+    Times loading of all parameters with a loader, taking the best of
+    several repeats.
+
+    Args:
+        loader (function): Loading function
+        loader_args (function): Returns loader arguments for a parameter
+        param_fnames (dict): Start of file names for each parameter
+    Returns:
+        best_time (float): Fastest time taken to load all parameters
+        param_dfs (dict): Dataframes and missing times for each parameter
+    """
+    best_time = None
+    for _ in range(BENCH_REPEATS):
+        start = time.perf_counter()
+        param_dfs = {param: loader(*loader_args(param, fname))
+                     for param, fname in param_fnames.items()}
+        elapsed = time.perf_counter() - start
+        if best_time is None or elapsed < best_time:
+            best_time = elapsed
+
+    return best_time, param_dfs
+
+
+if __name__ == "__main__":
+    main()
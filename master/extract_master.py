@@ -29,19 +29,16 @@ def main():
     if not os.path.exists(pickle_dir):
         os.makedirs(pickle_dir)
 
-    # Filter data for each airport and collect
-    for _, site_info in airport_info.iterrows():
+    # Ignore defence for now
+    airport_info = airport_info[airport_info['rules'] != 'defence']
 
-        # Ignore defence for now
-        if site_info['rules'] == 'defence':
-            continue
+    # Filter data for all airports at once
+    site_dfs = ex.get_all_site_data(param_dfs_missing_times, airport_info,
+                                    taf_dts)
 
-        # Get data for airport
-        site_df = ex.get_site_data(param_dfs_missing_times, site_info, taf_dts)
-
-        # If no data found, move to next airport
-        if site_df.empty:
-            continue
+    # Adjust and save data for each airport with data
+    for ind, site_df in site_dfs.items():
+        site_info = airport_info.loc[ind]
 
         # Predict busts and adjust data accordingly
         site_df = ba.adjust_site_df(site_df)
@@ -0,0 +1,94 @@
+"""
+Master script generating TAFs for all airports with extracted IMPROVER
+data, sharing a single pool of worker processes between airports rather
+than running taf_master.py once for each airport.
+
+Functions:
+    gen_site_taf: Generates TAF for an airport and saves to pickle file.
+    main: Main function.
+"""
+import glob
+import os
+import pickle
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+import common.calculations as ca
+import generate.generate_taf as ge
+
+# Define environment constants
+TAF_START = os.environ['TAF_START']
+SORTED_DATA = os.environ['SORTED_DATA']
+
+# Number of processes used to generate TAFs (0 to size to host)
+TAF_WORKERS = int(os.environ.get('TAF_WORKERS', 0))
+
+
+def gen_site_taf(pickle_file):
+    """
+    Generates TAF for an airport using IMPROVER data in pickle file, then
+    saves TAF types and bench to pickle file.
+
+    Args:
+        pickle_file (str): File containing IMPROVER data for airport
+    """
+    # Load IMPROVER data from pickle file
+    site_df = pd.read_pickle(pickle_file)
+
+    # Generate TAF and collect bench
+    nice_taf, ver_taf, bench = ge.taf_gen(site_df, serial=True)
+
+    # Save TAF types and bench to pickle file
+    with open(f'{pickle_file}_tafs.pkl', 'wb') as f:
+        pickle.dump([nice_taf, ver_taf, bench], f)
+
+
+def main():
+    """
+    Generates TAFs for all airports with data in pool of processes.
+    """
+    # Files containing IMPROVER data (ignoring already generated TAFs)
+    pickle_dir = f'{SORTED_DATA}/{TAF_START}'
+    pickle_files = sorted(fname for fname in glob.glob(f'{pickle_dir}/*.pkl')
+                          if not fname.endswith('_tafs.pkl'))
+
+    # If no pickle files exist, exit
+    if not pickle_files:
+        print(f'No data found for {TAF_START}. Exiting...')
+        return
+
+    # Generate TAFs in pool of processes, sized to host if number of
+    # workers not specified
+    max_workers = TAF_WORKERS or min(len(pickle_files), os.cpu_count())
+    failed = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+
+        # Submit a timed TAF generation task for each airport
+        futures = {executor.submit(ca.timed_call, gen_site_taf, [fname]):
+                   fname for fname in pickle_files}
+
+        # Report on each airport as it finishes, carrying on with other
+        # airports if TAF generation fails
+        for future in as_completed(futures):
+            icao = os.path.basename(futures[future])[:-len('.pkl')]
+            try:
+                _, elapsed = future.result()
+            except Exception as e:
+                print(f'Error generating TAF for {icao}: {e!r}',
+                      file=sys.stderr)
+                failed.append(icao)
+                continue
+            print(f'Generated TAF for {icao} in {elapsed:.1f}s')
+
+    # Exit with non-zero status if any TAFs could not be generated
+    if failed:
+        print(f'TAF generation failed for: {", ".join(sorted(failed))}',
+              file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+
+    main()